@@ -0,0 +1 @@
+"""Performance benchmarks for HomeTray, run with `python -m benchmarks`"""
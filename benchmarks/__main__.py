@@ -0,0 +1,353 @@
+"""
+Benchmarks HomeTray against a local fake Home Assistant and stores the results as JSON.
+
+    python -m benchmarks                                      # run and write benchmarks/results.json
+    python -m benchmarks --save-baseline                      # run and also write benchmarks/baseline.json
+    python -m benchmarks --compare benchmarks/baseline.json   # run and fail on regressions
+
+wxPython is replaced by a headless stand-in, so the numbers cover HomeTray's own code
+(polling, state handling, icon caching) and are comparable between machines with and without a display.
+Only its SVG rasterizer is kept if it is installed. Without it the icons aren't rendered, so get_icon
+then reports miss_no_render_us, the cost of a miss without the rendering, instead of miss_us.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections.abc import Iterator
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Any
+from typing import Callable
+
+from benchmarks import headlesswx
+from testing.fakehass import FakeHass
+
+ROOT = Path(__file__).parent.parent
+BASELINE = ROOT / 'benchmarks' / 'baseline.json'
+
+# names of the bundled icons, so the entities exercise several templates
+ICONS = ['mdi:ceiling-light', 'mdi:desk-lamp', 'mdi:desktop-tower-monitor', 'mdi:led-strip-variant', None]
+
+
+def load_hometray() -> types.SimpleNamespace:
+    """Imports the HomeTray modules the way `python hometray` does, with the headless wx in place"""
+    headlesswx.install()
+    sys.path.insert(0, str(ROOT / 'hometray'))
+    # the bundled icons are looked up relative to the working directory
+    os.chdir(ROOT)
+    app = importlib.import_module('app')
+    headless = importlib.import_module('headless')
+    hassclient = importlib.import_module('hassclient')
+    poller = importlib.import_module('poller')
+    return types.SimpleNamespace(
+        App=app.App,
+        IconManager=app.IconManager,
+        Config=app.Config,
+        HassClient=hassclient.HassClient,
+        StatePoller=poller.StatePoller,
+        PollPolicy=poller.PollPolicy,
+        HeadlessApp=headless.HeadlessApp,
+    )
+
+
+def populate(fake: FakeHass, count: int) -> None:
+    """Adds count lights, mixing icons, states and colours"""
+    for i in range(count):
+        attributes: dict[str, Any] = {'friendly_name': f'Light {i}'}
+        if ICONS[i % len(ICONS)] is not None:
+            attributes['icon'] = ICONS[i % len(ICONS)]
+        if i % 3 == 0:
+            attributes['rgb_color'] = [(i * 37) % 256, (i * 91) % 256, (i * 53) % 256]
+        fake.add_entity(f'light.bench_{i}', 'on' if i % 2 == 0 else 'off', **attributes)
+
+
+@contextlib.contextmanager
+def running_fake(count: int, latency: float) -> Iterator[FakeHass]:
+    fake = FakeHass(latency=latency).start()
+    populate(fake, count)
+    try:
+        yield fake
+    finally:
+        fake.stop()
+
+
+@contextlib.contextmanager
+def app_directory(fake: FakeHass) -> Iterator[Path]:
+    """A working directory with a config.ini that shows every light of the fake, next to the bundled icons like a release"""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='hometray-bench-') as directory:
+        Path(directory, 'icons').symlink_to(ROOT / 'icons', target_is_directory=True)
+        Path(directory, 'config.ini').write_text(f'[HASS]\nToken = {fake.token}\nApiUrl = {fake.api_url}\nDomains = light\n\n[COLORS]\n', encoding='utf8')
+        os.chdir(directory)
+        try:
+            yield Path(directory)
+        finally:
+            os.chdir(previous)
+
+
+def start_app(hometray: types.SimpleNamespace) -> Any:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return hometray.App(False)
+
+
+def stop_app(app: Any) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.OnExit()
+    headlesswx.discard()
+
+
+def summarize(samples: list[float], scale: float) -> dict[str, float]:
+    samples = sorted(sample * scale for sample in samples)
+    return {
+        'median': round(statistics.median(samples), 3),
+        'p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def rate(func: Callable[[], None], duration: float) -> float:
+    """Calls func for duration seconds and returns the calls per second"""
+    calls = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < duration:
+        func()
+        calls += 1
+    return round(calls / elapsed, 1)
+
+
+def bench_startup(hometray: types.SimpleNamespace, count: int, latency: float, repeat: int) -> dict[str, Any]:
+    """App.OnInit without a snapshot or raster cache (cold) and with both from the previous run (warm)"""
+    cold, warm = [], []
+    with running_fake(count, latency) as fake:
+        for _ in range(repeat):
+            with app_directory(fake):
+                app = start_app(hometray)
+                cold.append(app.startup_time)
+                stop_app(app)
+
+                app = start_app(hometray)
+                warm.append(app.startup_time)
+                stop_app(app)
+    return {'cold_ms': summarize(cold, 1000), 'warm_ms': summarize(warm, 1000)}
+
+
+def bench_requests(hometray: types.SimpleNamespace, count: int, latency: float, duration: float, pooled: bool) -> dict[str, float]:
+    """How many bulk polls, single refreshes and service calls the client gets through per second"""
+    with running_fake(count, latency) as fake:
+        # the plain transport is what the homeassistant_api client does on its own, for comparison
+        client = hometray.HassClient(fake.api_url, fake.token, dedup_window=0) if pooled else hometray.HassClient(fake.api_url, fake.token, cache_session=False)
+        poller = hometray.StatePoller(client, hometray.PollPolicy())
+        domain = client.get_domains()['light']
+        results = {
+            'bulk_polls_per_second': rate(poller.poll, duration),
+            'single_refreshes_per_second': rate(lambda: poller.refresh('light.bench_0', force=True), duration),
+            'service_calls_per_second': rate(lambda: domain.get_service('toggle').trigger(entity_id='light.bench_0'), duration),
+        }
+        results['connections_per_100_requests'] = round(fake.connections / len(fake.requests) * 100, 2)
+        return results
+
+
+def bench_concurrent_refresh(hometray: types.SimpleNamespace, latency: float, callers: int, rounds: int) -> dict[str, float]:
+    """Requests Home Assistant receives when several callers refresh the same entity at the same time"""
+    with running_fake(10, latency) as fake:
+        client = hometray.HassClient(fake.api_url, fake.token)
+        poller = hometray.StatePoller(client, hometray.PollPolicy())
+        barrier = threading.Barrier(callers)
+
+        def refresh() -> None:
+            for _ in range(rounds):
+                barrier.wait()
+                poller.refresh('light.bench_0', force=True)
+
+        threads = [threading.Thread(target=refresh) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {'requests_per_concurrent_refresh': round(len(fake.requests) / (callers * rounds), 3)}
+
+
+def bench_idle(hometray: types.SimpleNamespace, count: int, latency: float, duration: float) -> dict[str, float]:
+    """The request rate a running app puts on Home Assistant while nothing changes"""
+    with running_fake(count, latency) as fake, app_directory(fake):
+        app = start_app(hometray)
+        before = len(fake.requests)
+        time.sleep(duration)
+        requests = len(fake.requests) - before
+        stop_app(app)
+    return {'idle_requests_per_second': round(requests / duration, 3)}
+
+
+def bench_click(hometray: types.SimpleNamespace, count: int, latency: float, clicks: int) -> dict[str, Any]:
+    """
+    Time from on_left_down until the new icon is set (optimistic)
+    and until Home Assistant confirmed the new state (confirmed).
+    """
+    optimistic, confirmed = [], []
+    with running_fake(count, latency) as fake, app_directory(fake):
+        app = start_app(hometray)
+        headlesswx.pump()
+        tray_icon = next(tray_icon for tray_icon in app.tray_icons if tray_icon.entity_id == 'light.bench_1')
+
+        for _ in range(clicks):
+            expected = 'off' if fake.states['light.bench_1']['state'] == 'on' else 'on'
+            updates = tray_icon.icon_updates
+            start = time.perf_counter()
+            tray_icon.on_left_down(None)
+            headlesswx.pump()
+            optimistic.append(time.perf_counter() - start)
+            assert tray_icon.icon_updates == updates + 1, 'the click did not change the icon'
+
+            # the command executor runs commands in order, so this returns once the toggle finished
+            app.engine.commands.submit(lambda: None).result()
+            headlesswx.pump()
+            confirmed.append(time.perf_counter() - start)
+            assert app.engine.poller.states['light.bench_1'].state == expected == fake.states['light.bench_1']['state']
+
+        stop_app(app)
+    return {'optimistic_ms': summarize(optimistic, 1000), 'confirmed_ms': summarize(confirmed, 1000)}
+
+
+def bench_engine(hometray: types.SimpleNamespace, count: int, latency: float, repeat: int) -> dict[str, Any]:
+    """
+    The headless engine at many entities: loading and subscribing all of them (startup)
+    and a bulk poll in which a tenth of them changed, including writing the JSON lines (poll).
+    """
+    startup, poll = [], []
+    with running_fake(count, latency) as fake, app_directory(fake):
+        for _ in range(repeat):
+            Path('snapshot.json').unlink(missing_ok=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                headless = hometray.HeadlessApp(hometray.Config.load(), io.StringIO())
+                headless.engine.load()
+                headless.subscribe()
+                startup.append(time.perf_counter() - start)
+
+                for i in range(0, count, 10):
+                    entity = fake.states[f'light.bench_{i}']
+                    fake.add_entity(entity['entity_id'], 'off' if entity['state'] == 'on' else 'on', **entity['attributes'])
+                start = time.perf_counter()
+                headless.engine.poller.poll()
+                poll.append(time.perf_counter() - start)
+                headless.engine.stop()
+    return {'startup_ms': summarize(startup, 1000), 'poll_ms': summarize(poll, 1000)}
+
+
+def bench_get_icon(hometray: types.SimpleNamespace, renders: int) -> dict[str, Any]:
+    """IconManager.get_icon when the icon has to be rendered (miss) and when its handle is cached (hit)"""
+    icons = hometray.IconManager()
+    misses, hits = [], []
+    for i in range(renders):
+        # a colour that hasn't been rendered yet
+        color = [i % 256, (i // 256) % 256, 7]
+        start = time.perf_counter()
+        icons.get_icon('mdi:desk-lamp', 'on', color)
+        misses.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        icons.get_icon('mdi:desk-lamp', 'on', color)
+        hits.append(time.perf_counter() - start)
+    # without wxPython the stand-in returns blank images, so the misses don't include rendering the SVG
+    miss_key = 'miss_us' if headlesswx.RENDERS_SVG else 'miss_no_render_us'
+    return {miss_key: summarize(misses, 1_000_000), 'hit_us': summarize(hits, 1_000_000)}
+
+
+def flatten(results: dict[str, Any], prefix: str = '') -> dict[str, float]:
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f'{prefix}{key}.'))
+        else:
+            values[f'{prefix}{key}'] = value
+    return values
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Returns the measurements that got worse than the baseline by more than the tolerance"""
+    regressions = []
+    current = flatten(results)
+    for key, expected in flatten(baseline).items():
+        if key not in current or not expected:
+            continue
+        # rates are better when higher, durations when lower
+        ratio = expected / current[key] if '_per_second' in key else current[key] / expected
+        marker = ''
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            marker = '  <-- regression'
+        print(f'{key:<55} {expected:>12g} -> {current[key]:>12g}{marker}')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entities', default='10,100,500', help='entity counts for the startup benchmark')
+    parser.add_argument('--latency', type=float, default=0.002, help='seconds the fake server delays every response')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each startup benchmark')
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds each throughput benchmark runs')
+    parser.add_argument('--idle', type=float, default=6.0, help='seconds the idle request rate is observed')
+    parser.add_argument('--engine-entities', type=int, default=5000, help='entity count for the headless engine benchmark')
+    parser.add_argument('--clicks', type=int, default=50)
+    parser.add_argument('--renders', type=int, default=500)
+    parser.add_argument('--output', type=Path, default=ROOT / 'benchmarks' / 'results.json', help='where to write the results')
+    parser.add_argument('--save-baseline', action='store_true', help=f'also write the results to {BASELINE.relative_to(ROOT)}')
+    parser.add_argument('--compare', type=Path, help='baseline to compare the results with, exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    baseline = json.loads(args.compare.read_text(encoding='utf8')) if args.compare is not None else None
+    hometray = load_hometray()
+    results: dict[str, Any] = {}
+    for count in map(int, args.entities.split(',')):
+        print(f'startup with {count} entities...')
+        results.setdefault('startup', {})[str(count)] = bench_startup(hometray, count, args.latency, args.repeat)
+    print('requests...')
+    results['requests'] = bench_requests(hometray, 100, args.latency, args.duration, pooled=True)
+    results['requests'].update(bench_concurrent_refresh(hometray, args.latency, callers=8, rounds=20))
+    results['requests'].update(bench_idle(hometray, 100, args.latency, args.idle))
+    results['requests_plain_transport'] = bench_requests(hometray, 100, args.latency, args.duration, pooled=False)
+    print('click latency...')
+    results['click'] = bench_click(hometray, 100, args.latency, args.clicks)
+    print('headless engine...')
+    results['engine'] = {str(args.engine_entities): bench_engine(hometray, args.engine_entities, args.latency, args.repeat)}
+    print('get_icon...' if headlesswx.RENDERS_SVG else 'get_icon, without rendering as wxPython is not installed...')
+    results['get_icon'] = bench_get_icon(hometray, args.renders)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency': args.latency,
+        'renders_svg': headlesswx.RENDERS_SVG,
+        'results': results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2) + '\n', encoding='utf8')
+    print(f'results written to {args.output}')
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(report, indent=2) + '\n', encoding='utf8')
+        print(f'baseline written to {BASELINE}')
+
+    if baseline is not None:
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} regression(s) beyond {args.tolerance:.0%}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+A minimal headless stand-in for the parts of wxPython HomeTray uses.
+The benchmarks run with it, so they measure HomeTray's own code instead of native drawing
+and also work on machines without a display.
+"""
+from __future__ import annotations
+
+import re
+import struct
+import sys
+import types
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any
+from typing import Callable
+
+_calls: deque[tuple[Callable[..., Any], tuple[Any, ...]]] = deque()
+
+
+def pump() -> int:
+    """Runs the functions queued with wx.CallAfter, like one turn of the main loop, returns how many ran"""
+    count = 0
+    while _calls:
+        func, args = _calls.popleft()
+        func(*args)
+        count += 1
+    return count
+
+
+def discard() -> None:
+    """Drops the queued functions, e.g. of an app that has been shut down"""
+    _calls.clear()
+
+
+def CallAfter(func: Callable[..., Any], *args: Any) -> None:  # pylint: disable=invalid-name
+    _calls.append((func, args))
+
+
+class _Object:
+    """Accepts any constructor arguments and event bindings"""
+
+    def __init__(self, *_: Any, **__: Any) -> None:
+        super().__init__()
+
+    def Bind(self, *_: Any, **__: Any) -> None:  # pylint: disable=invalid-name
+        pass
+
+    def Destroy(self) -> None:  # pylint: disable=invalid-name
+        pass
+
+
+class App(_Object):
+    def __init__(self, *_: Any, **__: Any) -> None:
+        super().__init__()
+        self.OnInit()
+
+    def OnInit(self) -> bool:  # pylint: disable=invalid-name
+        return True
+
+    def SetTopWindow(self, _: Any) -> None:  # pylint: disable=invalid-name
+        pass
+
+    def MainLoop(self) -> None:  # pylint: disable=invalid-name
+        pump()
+
+
+class Frame(_Object):
+    def Close(self) -> None:  # pylint: disable=invalid-name
+        pass
+
+
+def _decode_png(data: bytes) -> tuple[int, int, bytes]:
+    """Decodes an unfiltered 8 bit RGBA PNG like the raster cache writes, returns no pixels for anything else"""
+    if not data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 0, 0, b''
+    width = height = 0
+    compressed = b''
+    offset = 8
+    while offset + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        chunk = data[offset + 8:offset + 8 + length]
+        if kind == b'IHDR':
+            width, height, depth, color_type = struct.unpack('>IIBB', chunk[:10])
+            if (depth, color_type) != (8, 6):
+                return 0, 0, b''
+        elif kind == b'IDAT':
+            compressed += chunk
+        offset += 12 + length
+
+    rows = zlib.decompress(compressed)
+    stride = width * 4 + 1
+    # every row starts with its filter type, only 0 (none) is supported
+    if any(rows[y * stride] != 0 for y in range(height)):
+        return 0, 0, b''
+    return width, height, b''.join(rows[y * stride + 1:(y + 1) * stride] for y in range(height))
+
+
+class Bitmap(_Object):
+    """Holds the RGBA buffer, a bitmap loaded from a file is decoded from the PNG the raster cache wrote"""
+
+    def __init__(self, path: str | None = None, _: int = 0) -> None:
+        super().__init__()
+        self.width = self.height = 0
+        self.buffer = b''
+        if path is not None:
+            self.width, self.height, self.buffer = _decode_png(Path(path).read_bytes())
+
+    @staticmethod
+    def FromBufferRGBA(width: int, height: int, buffer: bytes) -> Bitmap:  # pylint: disable=invalid-name
+        bitmap = Bitmap()
+        bitmap.width, bitmap.height, bitmap.buffer = width, height, bytes(buffer)
+        return bitmap
+
+    def IsOk(self) -> bool:  # pylint: disable=invalid-name
+        return len(self.buffer) == self.width * self.height * 4 > 0
+
+    def GetWidth(self) -> int:  # pylint: disable=invalid-name
+        return self.width
+
+    def GetHeight(self) -> int:  # pylint: disable=invalid-name
+        return self.height
+
+
+class _Rect:
+    def __init__(self, y: int) -> None:
+        super().__init__()
+        self.y = y
+
+    def GetPosition(self) -> _Rect:  # pylint: disable=invalid-name
+        return self
+
+
+def GetClientDisplayRect() -> _Rect:  # pylint: disable=invalid-name
+    # the tray icon size is read from the height of the taskbar
+    return _Rect(32)
+
+
+class TaskBarIcon(_Object):
+    """Remembers what it shows instead of drawing it"""
+
+    icon: Bitmap | None = None
+    tooltip: str | None = None
+    icon_updates: int = 0
+
+    def SetIcon(self, icon: Bitmap, tooltip: str | None = None) -> bool:  # pylint: disable=invalid-name
+        self.icon = icon
+        self.tooltip = tooltip
+        self.icon_updates += 1
+        return True
+
+    def RemoveIcon(self) -> bool:  # pylint: disable=invalid-name
+        self.icon = None
+        return True
+
+    def PopupMenu(self, _: Any) -> None:  # pylint: disable=invalid-name
+        pass
+
+
+_VIEW_BOX = re.compile(rb'viewBox="[-\d.]+ [-\d.]+ ([\d.]+) ([\d.]+)"')
+
+
+class SVGimage:
+    """Parses the size of the SVG and returns a blank image of the requested size, used when wxPython isn't installed"""
+
+    def __init__(self, width: float, height: float) -> None:
+        super().__init__()
+        self.width = width
+        self.height = height
+
+    @staticmethod
+    def CreateFromBytes(data: bytes, units: str = 'px', dpi: float = 96, do_copy: bool = True) -> SVGimage:  # pylint: disable=invalid-name
+        match = _VIEW_BOX.search(data)
+        return SVGimage(float(match.group(1)), float(match.group(2))) if match else SVGimage(24.0, 24.0)
+
+    def Rasterize(self, width: int, height: int, tx: float = 0, ty: float = 0, scale: float = 1) -> bytearray:  # pylint: disable=invalid-name
+        return bytearray(width * height * 4)
+
+
+def real_svg_image() -> Any | None:
+    """Returns the SVG rasterizer of wxPython if it is installed, it renders without a display"""
+    try:
+        from wx.svg._nanosvg import SVGimageBase  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return SVGimageBase
+
+
+# whether the icons are really rendered, set by install
+RENDERS_SVG = False
+
+
+def install() -> None:
+    """Registers the stand-in as the wx, wx.adv and wx.svg modules, keeping the SVG rasterizer of wxPython if it is installed"""
+    global RENDERS_SVG  # pylint: disable=global-statement
+    svg_image = real_svg_image()
+    RENDERS_SVG = svg_image is not None
+
+    wx = types.ModuleType('wx')
+    adv = types.ModuleType('wx.adv')
+    svg = types.ModuleType('wx.svg')
+    for name in ('CallAfter', 'App', 'Frame', 'Bitmap', 'GetClientDisplayRect'):
+        setattr(wx, name, globals()[name])
+    wx.BITMAP_TYPE_PNG = 15  # type: ignore[attr-defined]
+    adv.TaskBarIcon = TaskBarIcon  # type: ignore[attr-defined]
+    adv.EVT_TASKBAR_LEFT_DOWN = adv.EVT_TASKBAR_RIGHT_UP = object()  # type: ignore[attr-defined]
+    svg.SVGimage = svg_image or SVGimage  # type: ignore[attr-defined]
+    wx.adv, wx.svg = adv, svg  # type: ignore[attr-defined]
+
+    sys.modules.update({'wx': wx, 'wx.adv': adv, 'wx.svg': svg})
@@ -1,73 +1,44 @@
 """Main entry point for the application"""
 from __future__ import annotations
 
+import argparse
+import os
 import sys
-import wx
-import wx.adv
-from homeassistant_api import Client
 
-if getattr(sys, 'frozen', False):
-    from hometray.iconmanager import IconManager
-    from hometray.tray import EntityTrayIcon
-    from hometray.config import Config
-    from hometray.settings import Settings
-else:
-    from iconmanager import IconManager  # type:ignore
-    from tray import EntityTrayIcon  # type:ignore
-    from config import Config  # type:ignore
-    from settings import Settings  # type:ignore
 
-
-class App(wx.App):
-    """Main application class"""
-
-    frame: wx.Frame
-    tray_icons: list[EntityTrayIcon]
-
-    # pylint: disable=invalid-name
-    def OnInit(self) -> bool:
-        """Called when the application is initialized."""
-
-        # init GUI
-        self.frame = wx.Frame(None)
-        self.SetTopWindow(self.frame)
-
-        # load config
-        config = Config.load()
-        settings = Settings(config)
-        settings.initial_setup()
-
-        # init hass client
-        client = Client(config.api_url, config.token, cache_session=False)
-
-        # init tray icons
-        icons = IconManager()
-
-        self.tray_icons = []
-        for domain in config.domains:
-            for entity in client.get_entities()[domain].entities:
-                full_id = f'{domain}.{entity}'
-                if full_id in config.domain_entities_ignore or full_id in config.entities:
-                    continue
-
-                self.tray_icons.append(EntityTrayIcon(self.frame, full_id, client, icons, config, settings))
-
-        for entity in config.entities:
-            self.tray_icons.append(EntityTrayIcon(self.frame, entity, client, icons, config, settings))
-
-        return True
-
-    # pylint: disable=invalid-name
-    def OnExit(self) -> int:
-        """Called when the application is exiting."""
-        for tray_icon in self.tray_icons:
-            tray_icon.cleanup()
-
-        return 0
-
-
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     """Main entry point for the application"""
+    parser = argparse.ArgumentParser(prog='hometray', description='Control Home Assistant from the system tray.')
+    parser.add_argument('--headless', action='store_true', help='run without a display, writing state changes as JSON lines to stdout and reading commands like "toggle light.desk" from stdin')
+    parser.add_argument('--profile-startup', nargs='?', const='', metavar='FILE', help='print how long the imports and startup phases took until the first icon is shown, and write it as JSON to FILE if given')
+    args = parser.parse_args(argv)
+
+    # `python -m hometray` runs this file as part of the package, the modules import each other by their top-level names
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    if not getattr(sys, 'frozen', False) and module_dir not in sys.path:
+        sys.path.insert(0, module_dir)
+
+    if getattr(sys, 'frozen', False):
+        from hometray.startup import profile  # pylint: disable=import-outside-toplevel
+    else:
+        from startup import profile  # type:ignore  # pylint: disable=import-outside-toplevel
+    if args.profile_startup is not None:
+        profile.enable(args.profile_startup or None)
+
+    # only the selected mode is imported, so the headless mode runs without wx
+    if args.headless:
+        if getattr(sys, 'frozen', False):
+            from hometray import headless  # pylint: disable=import-outside-toplevel
+        else:
+            import headless  # type:ignore  # pylint: disable=import-outside-toplevel
+        profile.mark('imports')
+        return headless.main()
+
+    if getattr(sys, 'frozen', False):
+        from hometray.app import App  # pylint: disable=import-outside-toplevel
+    else:
+        from app import App  # type:ignore  # pylint: disable=import-outside-toplevel
+    profile.mark('imports')
     app = App(False)
     app.MainLoop()
     return 0
@@ -0,0 +1,158 @@
+"""The system tray application"""
+from __future__ import annotations
+
+import sys
+import time
+from typing import Any
+from pathlib import Path
+import wx
+import wx.adv
+
+if getattr(sys, 'frozen', False):
+    from hometray.display import icon_variants
+    from hometray.engine import Engine
+    from hometray.iconmanager import IconManager
+    from hometray.iconmanager import RasterCache
+    from hometray.tray import EntityTrayIcon
+    from hometray.tray import GroupTrayIcon
+    from hometray.config import Config
+    from hometray.settings import Settings
+    from hometray.startup import profile
+else:
+    from display import icon_variants  # type:ignore
+    from engine import Engine  # type:ignore
+    from iconmanager import IconManager  # type:ignore
+    from iconmanager import RasterCache  # type:ignore
+    from tray import EntityTrayIcon  # type:ignore
+    from tray import GroupTrayIcon  # type:ignore
+    from config import Config  # type:ignore
+    from settings import Settings  # type:ignore
+    from startup import profile  # type:ignore
+
+
+class App(wx.App):
+    """Main application class"""
+
+    frame: wx.Frame
+    config: Config
+    settings: Settings
+    engine: Engine
+    icons: IconManager
+    tray_icons: list[EntityTrayIcon]
+    group_icons: dict[str, GroupTrayIcon]
+    startup_time: float
+
+    # the config values the tray icons were last drawn with, see reconcile
+    _render_settings: tuple[Any, ...]
+
+    # pylint: disable=invalid-name
+    def OnInit(self) -> bool:
+        """Called when the application is initialized."""
+        start = time.perf_counter()
+
+        # init GUI
+        self.frame = wx.Frame(None)
+        self.SetTopWindow(self.frame)
+
+        # load config
+        self.config = config = Config.load()
+        self.settings = Settings(config)
+        self.settings.initial_setup()
+        profile.mark('config')
+
+        # draw the icons from the last known states right away and refresh them in the background
+        self.engine = engine = Engine(config, on_reconcile=lambda: wx.CallAfter(self.reconcile), on_redraw=lambda: wx.CallAfter(self.redraw_icons))
+        engine.load()
+        profile.mark('states loaded')
+
+        # init tray icons
+        raster_cache = RasterCache(Path(config.filename).absolute().parent / 'cache' / 'icons')
+        icon_packs = [Path(pack) for pack in config.icon_packs]
+        self.icons = IconManager(raster_cache, config.icon_cache_budget * 1024, config.color_quantization, icon_packs)
+
+        self.tray_icons = []
+        self.group_icons = {}
+        self._render_settings = self.render_settings(config)
+        self.add_group_icons(engine.select_groups())
+        self.add_tray_icons(engine.select_entities())
+        profile.mark('tray icons created')
+
+        engine.start()
+
+        self.startup_time = time.perf_counter() - start
+        print(f'Started {len(self.tray_icons) + len(self.group_icons)} tray icons in {self.startup_time * 1000:.0f} ms')
+
+        return True
+
+    @staticmethod
+    def render_settings(config: Config) -> tuple[Any, ...]:
+        """Returns the config values that change how the tray icons look"""
+        return (config.color_use_rgb_value, config.color_on, config.color_off, config.color_unknown, config.color_quantization)
+
+    def redraw_icons(self) -> None:
+        """Draws all tray icons from the last known states again"""
+        for tray_icon in [*self.tray_icons, *self.group_icons.values()]:
+            tray_icon.redraw()
+
+    def add_tray_icons(self, entity_ids: list[str]) -> None:
+        """Creates the tray icons for the given entities"""
+        engine = self.engine
+
+        # render the on/off/unknown icons of all entities in parallel, so state changes don't render SVGs
+        variants = []
+        for entity_id in entity_ids:
+            if entity_id in engine.poller.states:
+                variants.extend(icon_variants(engine.poller.states[entity_id], self.config))
+        self.icons.prerender(variants)
+
+        for entity_id in entity_ids:
+            self.tray_icons.append(EntityTrayIcon(self.frame, entity_id, engine.domains, engine.poller, engine.commands, self.icons, self.config, self.settings, engine.select_entities))
+
+    def add_group_icons(self, groups: dict[str, list[str]]) -> None:
+        """Creates one aggregated tray icon per group"""
+        engine = self.engine
+        for name, entity_ids in groups.items():
+            self.group_icons[name] = GroupTrayIcon(self.frame, name, entity_ids, engine.domains, engine.poller, engine.commands, self.icons, self.config, self.settings)
+
+    def reconcile(self) -> None:
+        """Applies the current config to the running app, only touching what changed"""
+        config = self.config
+
+        self.engine.apply_config()
+        self.icons.color_quantization = config.color_quantization
+        self.icons.icon_handles.budget = config.icon_cache_budget * 1024
+
+        entity_ids = self.engine.select_entities()
+        current = {tray_icon.entity_id: tray_icon for tray_icon in self.tray_icons}
+        for entity_id, tray_icon in current.items():
+            if entity_id not in entity_ids:
+                tray_icon.cleanup()
+        self.tray_icons = [current[entity_id] for entity_id in entity_ids if entity_id in current]
+
+        groups = self.engine.select_groups()
+        for name, group_icon in list(self.group_icons.items()):
+            if name not in groups:
+                group_icon.cleanup()
+                del self.group_icons[name]
+            else:
+                group_icon.set_members(groups[name])
+
+        render_settings = self.render_settings(config)
+        if render_settings != self._render_settings:
+            self._render_settings = render_settings
+            self.redraw_icons()
+
+        self.add_group_icons({name: entity_ids for name, entity_ids in groups.items() if name not in self.group_icons})
+        self.add_tray_icons([entity_id for entity_id in entity_ids if entity_id not in current])
+
+    # pylint: disable=invalid-name
+    def OnExit(self) -> int:
+        """Called when the application is exiting."""
+        self.engine.stop()
+        for tray_icon in [*self.tray_icons, *self.group_icons.values()]:
+            tray_icon.cleanup()
+        if self.icons.raster_cache is not None:
+            self.icons.raster_cache.close()
+        self.frame.Close()
+
+        return 0
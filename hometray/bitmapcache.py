@@ -0,0 +1,68 @@
+"""A size bounded least recently used cache"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Generic
+from typing import TypeVar
+
+T = TypeVar('T')
+
+
+class BitmapCache(Generic[T]):
+    """Keeps the most recently used entries until their accounted size exceeds the budget"""
+
+    def __init__(self, budget: int) -> None:
+        super().__init__()
+        self.budget: int = budget
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: OrderedDict[Hashable, tuple[T, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> T | None:
+        """Returns the cached entry and marks it as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: T, size: int) -> None:
+        """Adds an entry, evicting the least recently used ones if the budget is exceeded"""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+
+            self._entries[key] = (value, size)
+            self.size += size
+
+            # the newest entry is always kept, even if it exceeds the budget on its own
+            while self.size > self.budget and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Removes all entries, the counters are kept"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def quantize_color(color: list[int], step: int) -> list[int]:
+    """Rounds every channel to a multiple of step, so nearly identical colours share one cache entry"""
+    if step <= 1:
+        return list(color)
+    return [min(255, round(c / step) * step) for c in color]
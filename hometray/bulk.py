@@ -0,0 +1,78 @@
+"""Service calls for many entities at once"""
+from __future__ import annotations
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+if getattr(sys, 'frozen', False):
+    from hometray.entitystate import EntityState
+    from hometray.poller import StatePoller
+    from hometray.registry import DomainRegistry
+else:
+    from entitystate import EntityState  # type:ignore
+    from poller import StatePoller  # type:ignore
+    from registry import DomainRegistry  # type:ignore
+
+
+def plan_batches(domains: DomainRegistry, service: str, entity_ids: list[str]) -> dict[str, list[str]]:
+    """Returns the entity ids per domain the service has to be called through, using as few requests as possible"""
+    # the homeassistant domain forwards e.g. turn_off to the domain of every entity, so one request covers all of them
+    if domains.has_service('homeassistant', service):
+        return {'homeassistant': list(entity_ids)}
+
+    batches: dict[str, list[str]] = {}
+    for entity_id in entity_ids:
+        batches.setdefault(entity_id.split('.')[0], []).append(entity_id)
+    return batches
+
+
+def call_service_bulk(domains: DomainRegistry, poller: StatePoller, service: str, entity_ids: list[str], max_workers: int = 4, **service_data: Any) -> None:
+    """
+    Calls a service for all given entities with one request per batch, see plan_batches,
+    running several batches concurrently. The affected states are then taken from the responses
+    and the entities Home Assistant didn't report are confirmed with a single state fetch.
+    """
+    batches = plan_batches(domains, service, entity_ids)
+
+    def call(domain_id: str, batch: list[str]) -> list[EntityState]:
+        if not domains.has_service(domain_id, service):
+            print(f'Service {domain_id}.{service} is not available for', ', '.join(batch))
+            return []
+        return domains.call(domain_id, service, entity_id=batch, **service_data)
+
+    results: list[list[EntityState]] = []
+    errors: list[BaseException] = []
+    if len(batches) == 1:
+        results.append(call(*next(iter(batches.items()))))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches)), thread_name_prefix='BulkCommands') as pool:
+            futures = [pool.submit(call, domain_id, batch) for domain_id, batch in batches.items()]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except (KeyboardInterrupt, SystemExit):
+                    raise
+                except BaseException as e:  # pylint: disable=broad-except
+                    # including the errors of homeassistant_api, which derive from BaseException
+                    errors.append(e)
+
+    targets = set(entity_ids)
+    confirmed = set()
+    for entity_id in entity_ids:
+        poller.boost(entity_id)
+    for states in results:
+        for state in states:
+            poller.apply(state, force=state.entity_id in targets)
+            confirmed.add(state.entity_id)
+
+    missing = [entity_id for entity_id in entity_ids if entity_id not in confirmed]
+    if len(missing) >= poller.bulk_threshold:
+        poller.poll()
+    else:
+        for entity_id in missing:
+            poller.refresh(entity_id, force=True)
+
+    # the batches that succeeded are applied above, the failure is still reported to the caller
+    if errors:
+        raise errors[0]
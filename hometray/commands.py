@@ -0,0 +1,118 @@
+"""Runs Home Assistant service calls off the UI thread"""
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Hashable
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+
+
+class CommandExecutor:
+    """Executes commands in the background, in the order they were submitted"""
+
+    def __init__(self, min_interval: float = 0.25) -> None:
+        super().__init__()
+        # a single worker keeps e.g. two quick toggles of the same entity in order
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='Commands')
+        self.coalescer: CommandCoalescer = CommandCoalescer(self, min_interval)
+
+    def submit(self, command: Callable[[], Any], on_error: Callable[[BaseException], None] | None = None) -> Future[Any]:
+        """Queues a command, on_error is called from the worker thread if it raises"""
+
+        def run() -> Any:
+            try:
+                return command()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except BaseException as e:  # pylint: disable=broad-except
+                # including the errors of homeassistant_api, which derive from BaseException
+                print('Command failed:', e)
+                if on_error is not None:
+                    on_error(e)
+                raise
+
+        return self._executor.submit(run)
+
+    def submit_latest(self, key: Hashable, command: Callable[[], Any], on_error: Callable[[BaseException], None] | None = None) -> None:
+        """Queues a command of a continuous control, see CommandCoalescer"""
+        self.coalescer.submit(key, command, on_error)
+
+    def shutdown(self) -> None:
+        """Drops queued commands and waits for the running one to finish"""
+        self.coalescer.close()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class CommandCoalescer:
+    """
+    Rate limits the commands of continuous controls, e.g. dragging in a colour picker or a brightness slider.
+    Per key, e.g. (entity id, service, field), at most one command is running and the next one is sent
+    min_interval seconds after the previous one was, at the earliest. While waiting only the newest
+    command is kept, so the intermediate values are skipped but the final one is always sent.
+    """
+
+    def __init__(self, executor: CommandExecutor, min_interval: float = 0.25) -> None:
+        super().__init__()
+        self.executor: CommandExecutor = executor
+        self.min_interval: float = min_interval
+        self._lock = threading.Lock()
+        self._pending: dict[Hashable, tuple[Callable[[], Any], Callable[[BaseException], None] | None]] = {}
+        # keys with a command in the executor or a timer waiting to send the pending one
+        self._busy: set[Hashable] = set()
+        self._last_sent: dict[Hashable, float] = {}
+        self._timers: dict[Hashable, threading.Timer] = {}
+        self._closed: bool = False
+
+    def submit(self, key: Hashable, command: Callable[[], Any], on_error: Callable[[BaseException], None] | None = None) -> None:
+        """Queues the command, replacing a pending command with the same key that hasn't been sent yet"""
+        with self._lock:
+            if self._closed:
+                return
+            self._pending[key] = (command, on_error)
+            if key in self._busy:
+                return
+            self._busy.add(key)
+        self._schedule(key)
+
+    def close(self) -> None:
+        """Drops the pending commands"""
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+            timers = list(self._timers.values())
+        for timer in timers:
+            timer.cancel()
+
+    def _schedule(self, key: Hashable) -> None:
+        delay = self._last_sent.get(key, float('-inf')) + self.min_interval - time.monotonic()
+        if delay <= 0:
+            self._send(key)
+            return
+
+        timer = threading.Timer(delay, self._send, (key,))
+        timer.daemon = True
+        with self._lock:
+            self._timers[key] = timer
+        timer.start()
+
+    def _send(self, key: Hashable) -> None:
+        with self._lock:
+            self._timers.pop(key, None)
+            if self._closed or key not in self._pending:
+                self._busy.discard(key)
+                return
+            command, on_error = self._pending.pop(key)
+            self._last_sent[key] = time.monotonic()
+
+        future = self.executor.submit(command, on_error)
+        future.add_done_callback(lambda _: self._on_done(key))
+
+    def _on_done(self, key: Hashable) -> None:
+        with self._lock:
+            if key not in self._pending:
+                self._busy.discard(key)
+                return
+        self._schedule(key)
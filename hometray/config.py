@@ -2,7 +2,12 @@
 from __future__ import annotations
 
 import configparser
+import contextlib
+import os
+import tempfile
+import threading
 from collections.abc import Iterable
+from collections.abc import Iterator
 from typing import Any
 from typing import Callable
 from typing import Generic
@@ -13,9 +18,13 @@ T = TypeVar('T')
 
 
 class ConfigProperty(Generic[T]):
-    """A generic config property"""
+    """
+    A generic config property.
+    Declared on the class as a descriptor and bound to a config file per instance
+    by assigning a configured property to it in __init__.
+    """
 
-    _configured: bool = False
+    _name: str
     _config_parser: configparser.ConfigParser
     _section: str
     _key: str
@@ -23,9 +32,12 @@ class ConfigProperty(Generic[T]):
     _deserialize: Callable[[str], T]
     _serialize: Callable[[T], str]
     _save: Callable[[], None]
+    _lock: threading.Lock
+    _cached: bool = False
+    _value: T
 
     @classmethod
-    def configure(cls, config_parser: configparser.ConfigParser, section: str, key: str, default: T, deserialize: Callable[[str], T] | None = None, serialize: Callable[[T], str] | None = None, save: Callable[[], None] | None = None) -> ConfigProperty[T]:
+    def configure(cls, config_parser: configparser.ConfigParser, section: str, key: str, default: T, deserialize: Callable[[str], T] | None = None, serialize: Callable[[T], str] | None = None, save: Callable[[], None] | None = None, lock: threading.Lock | None = None) -> ConfigProperty[T]:
         """Generate a confgiured instance of the property"""
 
         def identity(x: T) -> T:
@@ -42,22 +54,47 @@ class ConfigProperty(Generic[T]):
         instance._deserialize = identity if deserialize is None else deserialize  # type: ignore
         instance._serialize = identity if serialize is None else serialize  # type: ignore
         instance._save = nop if save is None else save
+        # shared with the config, which reloads the file on another thread
+        instance._lock = threading.Lock() if lock is None else lock
         return instance
 
+    def __set_name__(self, owner: Any, name: str) -> None:
+        self._name = name
+
     def __get__(self, instance: Any | None, owner: Any | None) -> T:
-        print('__get__', instance, owner)
-        if not self._config_parser.has_option(self._section, self._key):
-            return self._default
-        return self._deserialize(self._config_parser.get(self._section, self._key))
+        if instance is None:
+            return self  # type: ignore
+        return instance.__dict__[self._name].get()
 
     def __set__(self, instance: Any | None, value: ConfigProperty[Any] | T) -> None:
-        print('__set__', instance, value, type(self))
-        if not self._configured:
-            self.__dict__ = value.__dict__
-            self._configured = True
+        if isinstance(value, ConfigProperty):
+            instance.__dict__[self._name] = value
         else:
+            instance.__dict__[self._name].set(value)
+
+    def get(self) -> T:
+        """Returns the deserialized value, it is only deserialized on the first read after a change"""
+        if not self._cached:
+            with self._lock:
+                if not self._cached:
+                    if self._config_parser.has_option(self._section, self._key):
+                        self._value = self._deserialize(self._config_parser.get(self._section, self._key))
+                    else:
+                        self._value = self._default
+                    self._cached = True
+        return self._value
+
+    def set(self, value: T) -> None:
+        """Stores the value and saves the config"""
+        with self._lock:
             self._config_parser.set(self._section, self._key, value=self._serialize(value))
-            self._save()
+            self._value = value
+            self._cached = True
+        self._save()
+
+    def invalidate(self) -> None:
+        """Drops the cached value, e.g. after the config file was read again"""
+        self._cached = False
 
 
 class SerializationHelpers:
@@ -73,6 +110,11 @@ class SerializationHelpers:
         """Serialize a list to a comma separated string"""
         return ','.join(value)
 
+    @staticmethod
+    def deserialize_bool(value: str) -> bool:
+        """Deserialize a boolean, accepting the values understood by configparser"""
+        return value.strip().lower() in ('1', 'yes', 'true', 'on')
+
     @staticmethod
     def deserialize_color(value: str) -> list[int]:
         return list(map(int, value.split(',')))
@@ -91,47 +133,159 @@ class Config:
     domains: ConfigProperty[list[str]] = ConfigProperty()
     domain_entities_ignore: ConfigProperty[list[str]] = ConfigProperty()
     update_interval: ConfigProperty[int] = ConfigProperty()
+    update_interval_max: ConfigProperty[int] = ConfigProperty()
+    update_backoff: ConfigProperty[float] = ConfigProperty()
+    fast_poll_interval: ConfigProperty[float] = ConfigProperty()
+    fast_poll_window: ConfigProperty[int] = ConfigProperty()
+    push_updates: ConfigProperty[bool] = ConfigProperty()
+    request_timeout: ConfigProperty[float] = ConfigProperty()
+    command_interval: ConfigProperty[float] = ConfigProperty()
+    group_domains: ConfigProperty[bool] = ConfigProperty()
+    diagnostics: ConfigProperty[bool] = ConfigProperty()
+    metrics_file: ConfigProperty[str] = ConfigProperty()
 
     color_use_rgb_value: ConfigProperty[bool] = ConfigProperty()
     color_on: ConfigProperty[list[int]] = ConfigProperty()
     color_off: ConfigProperty[list[int]] = ConfigProperty()
     color_unknown: ConfigProperty[list[int]] = ConfigProperty()
+    color_quantization: ConfigProperty[int] = ConfigProperty()
+    icon_cache_budget: ConfigProperty[int] = ConfigProperty()
+    icon_packs: ConfigProperty[list[str]] = ConfigProperty()
 
-    def __init__(self, filename: str, section: str, color_section: str):
+    def __init__(self, filename: str, section: str, color_section: str, groups_section: str = 'GROUPS'):
         super().__init__()
 
         self._filename = filename
         self._main_section = section
         self._color_section = color_section
+        self._groups_section = groups_section
+
+        self._batch_depth = 0
+        self._batch_dirty = False
+        self._listeners: list[Callable[[], None]] = []
+        # the file is reloaded on a background thread while the values are read and set on others
+        self._lock = threading.Lock()
 
         self._config = configparser.ConfigParser()
         self._config.read(self._filename)
+        self._mtime = self._read_mtime()
 
         self._ensure_section_exists(self._main_section)
         self._ensure_section_exists(self._color_section)
 
         # main section
-        self.token = ConfigProperty.configure(self._config, self._main_section, 'Token', None, save=self.save)
-        self.api_url = ConfigProperty.configure(self._config, self._main_section, 'ApiUrl', None, save=self.save)
-        self.entities = ConfigProperty.configure(self._config, self._main_section, 'Entities', [], SerializationHelpers.deserialize_list, SerializationHelpers.serialize_list, self.save)
-        self.domains = ConfigProperty.configure(self._config, self._main_section, 'Domains', [], SerializationHelpers.deserialize_list, SerializationHelpers.serialize_list, self.save)
-        self.domain_entities_ignore = ConfigProperty.configure(self._config, self._main_section, 'DomainEntitiesIgnore', [], SerializationHelpers.deserialize_list, SerializationHelpers.serialize_list, self.save)
-        self.update_interval = ConfigProperty.configure(self._config, self._main_section, 'UpdateInterval', 5, int, str, self.save)
+        self.token = ConfigProperty.configure(self._config, self._main_section, 'Token', None, save=self.save, lock=self._lock)
+        self.api_url = ConfigProperty.configure(self._config, self._main_section, 'ApiUrl', None, save=self.save, lock=self._lock)
+        self.entities = ConfigProperty.configure(self._config, self._main_section, 'Entities', [], SerializationHelpers.deserialize_list, SerializationHelpers.serialize_list, self.save, lock=self._lock)
+        self.domains = ConfigProperty.configure(self._config, self._main_section, 'Domains', [], SerializationHelpers.deserialize_list, SerializationHelpers.serialize_list, self.save, lock=self._lock)
+        self.domain_entities_ignore = ConfigProperty.configure(self._config, self._main_section, 'DomainEntitiesIgnore', [], SerializationHelpers.deserialize_list, SerializationHelpers.serialize_list, self.save, lock=self._lock)
+        self.update_interval = ConfigProperty.configure(self._config, self._main_section, 'UpdateInterval', 5, int, str, self.save, lock=self._lock)
+        self.update_interval_max = ConfigProperty.configure(self._config, self._main_section, 'UpdateIntervalMax', 60, int, str, self.save, lock=self._lock)
+        self.update_backoff = ConfigProperty.configure(self._config, self._main_section, 'UpdateBackoff', 1.5, float, str, self.save, lock=self._lock)
+        self.fast_poll_interval = ConfigProperty.configure(self._config, self._main_section, 'FastPollInterval', 1.0, float, str, self.save, lock=self._lock)
+        self.fast_poll_window = ConfigProperty.configure(self._config, self._main_section, 'FastPollWindow', 10, int, str, self.save, lock=self._lock)
+        self.push_updates = ConfigProperty.configure(self._config, self._main_section, 'PushUpdates', False, SerializationHelpers.deserialize_bool, str, self.save, lock=self._lock)
+        self.request_timeout = ConfigProperty.configure(self._config, self._main_section, 'RequestTimeout', 10.0, float, str, self.save, lock=self._lock)
+        self.command_interval = ConfigProperty.configure(self._config, self._main_section, 'CommandInterval', 0.25, float, str, self.save, lock=self._lock)
+        self.group_domains = ConfigProperty.configure(self._config, self._main_section, 'GroupDomains', False, SerializationHelpers.deserialize_bool, str, self.save, lock=self._lock)
+        self.diagnostics = ConfigProperty.configure(self._config, self._main_section, 'Diagnostics', False, SerializationHelpers.deserialize_bool, str, self.save, lock=self._lock)
+        self.metrics_file = ConfigProperty.configure(self._config, self._main_section, 'MetricsFile', '', save=self.save, lock=self._lock)
 
         # color section
-        self.color_use_rgb_value = ConfigProperty.configure(self._config, self._color_section, 'UseRGBValue', True, bool, str, self.save)
-        self.color_on = ConfigProperty.configure(self._config, self._color_section, 'On', [253, 213, 27], SerializationHelpers.deserialize_color, SerializationHelpers.serialize_color, self.save)
-        self.color_off = ConfigProperty.configure(self._config, self._color_section, 'Off', [225, 225, 225], SerializationHelpers.deserialize_color, SerializationHelpers.serialize_color, self.save)
-        self.color_unknown = ConfigProperty.configure(self._config, self._color_section, 'Unknown', [100, 100, 100], SerializationHelpers.deserialize_color, SerializationHelpers.serialize_color, self.save)
+        self.color_use_rgb_value = ConfigProperty.configure(self._config, self._color_section, 'UseRGBValue', True, bool, str, self.save, lock=self._lock)
+        self.color_on = ConfigProperty.configure(self._config, self._color_section, 'On', [253, 213, 27], SerializationHelpers.deserialize_color, SerializationHelpers.serialize_color, self.save, lock=self._lock)
+        self.color_off = ConfigProperty.configure(self._config, self._color_section, 'Off', [225, 225, 225], SerializationHelpers.deserialize_color, SerializationHelpers.serialize_color, self.save, lock=self._lock)
+        self.color_unknown = ConfigProperty.configure(self._config, self._color_section, 'Unknown', [100, 100, 100], SerializationHelpers.deserialize_color, SerializationHelpers.serialize_color, self.save, lock=self._lock)
+        self.color_quantization = ConfigProperty.configure(self._config, self._color_section, 'Quantization', 0, int, str, self.save, lock=self._lock)
+        self.icon_cache_budget = ConfigProperty.configure(self._config, self._color_section, 'IconCacheBudgetKB', 8192, int, str, self.save, lock=self._lock)
+        self.icon_packs = ConfigProperty.configure(self._config, self._color_section, 'IconPacks', [], SerializationHelpers.deserialize_list, SerializationHelpers.serialize_list, self.save, lock=self._lock)
 
     @classmethod
     def load(cls: type[Config], filename: str = 'config.ini', section: str = 'HASS', color_section: str = 'COLORS') -> Config:
         """Load the config from the given file"""
         return cls(filename, section, color_section)
 
+    @property
+    def groups(self) -> dict[str, list[str]]:
+        """
+        The groups section, mapping a group name to its members: entity ids,
+        domain:<domain> or area:<area>. Every group gets one aggregated tray icon.
+        """
+        with self._lock:
+            if not self._config.has_section(self._groups_section):
+                return {}
+            # configparser lower-cases the keys, so the names are title-cased for display
+            return {name.replace('_', ' ').title(): SerializationHelpers.deserialize_list(value) for name, value in self._config.items(self._groups_section)}
+
+    @property
+    def filename(self) -> str:
+        """The path of the config file"""
+        return self._filename
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Registers a callback that is invoked after the config was saved or reloaded"""
+        self._listeners.append(listener)
+
+    def reload_if_changed(self) -> bool:
+        """Reads the config file again if it was changed by someone else, e.g. edited by hand"""
+        with self._lock:
+            mtime = self._read_mtime()
+            if mtime == self._mtime:
+                return False
+
+            self._config.clear()
+            self._config.read(self._filename)
+            self._mtime = mtime
+            self._ensure_section_exists(self._main_section)
+            self._ensure_section_exists(self._color_section)
+            for value in self.__dict__.values():
+                if isinstance(value, ConfigProperty):
+                    value.invalidate()
+
+        self._notify()
+        return True
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[Config]:
+        """Groups several assignments, the config file is written once when the outermost batch ends"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._batch_dirty:
+                self.save()
+
     def save(self) -> None:
-        with open(self._filename, 'w', encoding='utf8') as configfile:
-            self._config.write(configfile)
+        """Writes the config file atomically, or once the current batch ends"""
+        if self._batch_depth > 0:
+            self._batch_dirty = True
+            return
+        self._batch_dirty = False
+
+        # write to a temporary file next to the config and swap it in, so a crash never leaves a truncated file
+        directory = os.path.dirname(os.path.abspath(self._filename))
+        with self._lock:
+            fd, temp_filename = tempfile.mkstemp(prefix='.config-', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf8') as configfile:
+                    self._config.write(configfile)
+                os.replace(temp_filename, self._filename)
+            except BaseException:
+                os.unlink(temp_filename)
+                raise
+            self._mtime = self._read_mtime()
+        self._notify()
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            listener()
+
+    def _read_mtime(self) -> int | None:
+        try:
+            return os.stat(self._filename).st_mtime_ns
+        except OSError:
+            return None
 
     def _ensure_section_exists(self, section_name: str) -> None:
         if not self._config.has_section(section_name):
@@ -0,0 +1,81 @@
+"""How an entity or group state is presented, independent of the tray"""
+from __future__ import annotations
+
+import sys
+from typing import NamedTuple
+from typing import TYPE_CHECKING
+
+if getattr(sys, 'frozen', False):
+    from hometray.config import Config
+    from hometray.entitystate import EntityState
+    from hometray.groups import GroupSummary
+else:
+    from config import Config  # type:ignore
+    from entitystate import EntityState  # type:ignore
+    from groups import GroupSummary  # type:ignore
+
+if TYPE_CHECKING:
+    if getattr(sys, 'frozen', False):
+        from hometray.iconmanager import IconVariant
+    else:
+        from iconmanager import IconVariant  # type:ignore
+
+
+class Display(NamedTuple):
+    """What a tray icon shows: the icon, the state it is drawn for, its colour and the tooltip"""
+
+    icon: str
+    state: str
+    color: list[int]
+    tooltip: str
+
+
+def state_color(state: str, config: Config) -> list[int]:
+    """Returns the configured colour for an on/off/other state"""
+    if state == 'on':
+        return config.color_on
+    if state == 'off':
+        return config.color_off
+    return config.color_unknown
+
+
+def entity_display(state: EntityState, config: Config, stale: bool = False, offline: bool = False) -> Display:
+    """Returns how the state of an entity is shown"""
+    entity_state = state.state
+    entity_icon = state.icon or 'default'
+    entity_name = state.name
+    if stale:
+        entity_name += ' (not updated yet)'
+    if offline:
+        # drawn like an unavailable entity, with the unknown colour
+        entity_state = 'unavailable'
+        entity_name += ' (Home Assistant unreachable)'
+
+    if entity_state == 'on' and config.color_use_rgb_value and state.rgb_color is not None:
+        color = list(state.rgb_color)
+    else:
+        color = state_color(entity_state, config)
+
+    return Display(entity_icon, entity_state, color, entity_name)
+
+
+def group_display(name: str, summary: GroupSummary, icon: str, config: Config, stale: bool = False, offline: bool = False) -> Display:
+    """Returns how the summary of a group is shown"""
+    state = summary.state
+    tooltip = f'{name}: {summary.describe()}'
+    if stale:
+        tooltip += ' (not updated yet)'
+    if offline:
+        state = 'unavailable'
+        tooltip += ' (Home Assistant unreachable)'
+    return Display(icon, state, state_color(state, config), tooltip)
+
+
+def icon_variants(state: EntityState, config: Config) -> list[IconVariant]:
+    """Returns the icon variants an entity can switch between, so they can be rendered ahead of time"""
+    icon = state.icon or 'default'
+    on_color = config.color_on
+    if state.state == 'on' and config.color_use_rgb_value and state.rgb_color is not None:
+        on_color = list(state.rgb_color)
+    unknown_state = state.state if state.state not in ('on', 'off') else 'unavailable'
+    return [(icon, 'on', on_color), (icon, 'off', config.color_off), (icon, unknown_state, config.color_unknown)]
@@ -0,0 +1,255 @@
+"""The state tracking and command pipeline, independent of how the states are presented"""
+from __future__ import annotations
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import TYPE_CHECKING
+
+if getattr(sys, 'frozen', False):
+    from hometray.commands import CommandExecutor
+    from hometray.config import Config
+    from hometray.groups import GroupResolver
+    from hometray.health import ConnectionHealth
+    from hometray.metrics import metrics
+    from hometray.poller import PollPolicy
+    from hometray.poller import StatePoller
+    from hometray.registry import DomainRegistry
+    from hometray.scheduler import Job
+    from hometray.scheduler import Scheduler
+    from hometray.snapshot import Snapshot
+else:
+    from commands import CommandExecutor  # type:ignore
+    from config import Config  # type:ignore
+    from groups import GroupResolver  # type:ignore
+    from health import ConnectionHealth  # type:ignore
+    from metrics import metrics  # type:ignore
+    from poller import PollPolicy  # type:ignore
+    from poller import StatePoller  # type:ignore
+    from registry import DomainRegistry  # type:ignore
+    from scheduler import Job  # type:ignore
+    from scheduler import Scheduler  # type:ignore
+    from snapshot import Snapshot  # type:ignore
+
+if TYPE_CHECKING:
+    if getattr(sys, 'frozen', False):
+        from hometray.hassclient import HassClient
+        from hometray.push import StateStream
+    else:
+        from hassclient import HassClient  # type:ignore
+        from push import StateStream  # type:ignore
+
+
+def nop() -> None:
+    pass
+
+
+class LazyClient:
+    """
+    Stands in for the HassClient until the first request is sent, so homeassistant_api, which takes
+    longer to import than the rest of HomeTray, isn't loaded before the icons are drawn from a snapshot.
+    """
+
+    def __init__(self, api_url: str, token: str, **kwargs: Any) -> None:
+        super().__init__()
+        self._args: tuple[str, str] = (api_url, token)
+        self._kwargs: dict[str, Any] = kwargs
+        self._client: HassClient | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> HassClient:
+        """Returns the client, creating it on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if getattr(sys, 'frozen', False):
+                        from hometray.hassclient import HassClient  # pylint: disable=import-outside-toplevel,redefined-outer-name
+                    else:
+                        from hassclient import HassClient  # type:ignore  # pylint: disable=import-outside-toplevel,redefined-outer-name
+                    self._client = HassClient(*self._args, **self._kwargs)
+        return self._client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+
+class Engine:
+    """
+    Keeps the states of the configured entities up to date and runs commands.
+    The presentation layer (tray icons or JSON lines) is told through two callbacks, which can be
+    invoked from any thread: on_reconcile when the selected entities may have changed, e.g. after
+    the config was edited, and on_redraw when everything should be drawn again, e.g. when
+    Home Assistant became unreachable.
+    """
+
+    stream: StateStream | None = None
+    poll_job: Job | None = None
+    probe_job: Job | None = None
+
+    def __init__(self, config: Config, on_reconcile: Callable[[], None] = nop, on_redraw: Callable[[], None] = nop) -> None:
+        super().__init__()
+        self.config: Config = config
+        self.on_reconcile: Callable[[], None] = on_reconcile
+        self.on_redraw: Callable[[], None] = on_redraw
+
+        metrics.enabled = config.diagnostics
+        self.health: ConnectionHealth = ConnectionHealth()
+        self.health.add_listener(self.on_health_changed)
+        self.client: HassClient = cast('HassClient', LazyClient(config.api_url, config.token, timeout=(3.05, config.request_timeout), health=self.health))
+
+        # fetch all states once, then keep them up to date with adaptive per-entity intervals
+        self.poller: StatePoller = StatePoller(self.client, self.poll_policy(config))
+        self.domains: DomainRegistry = DomainRegistry(self.client)
+        self.groups: GroupResolver = GroupResolver(self.client)
+        self.scheduler: Scheduler = Scheduler()
+        self.commands: CommandExecutor = CommandExecutor(config.command_interval)
+        self.snapshot: Snapshot = Snapshot.next_to(config.filename)
+
+    def load(self) -> None:
+        """Loads the states from the snapshot, refreshing them once the engine is started, or from Home Assistant"""
+        data = self.snapshot.load()
+        if data is not None:
+            self.poller.restore(data['states'])
+            self.domains.restore(data['services'])
+            self.scheduler.call_soon(self.revalidate)
+        else:
+            self.fetch()
+            self.save_snapshot()
+
+    def start(self) -> None:
+        """Starts polling or the WebSocket stream and the background jobs"""
+        self.apply_update_mode()
+
+        # apply changes from the settings dialog or to config.ini without a restart
+        self.config.add_listener(self.on_reconcile)
+        self.scheduler.every(2, self.reload_config)
+        self.scheduler.every(15, self.write_metrics)
+        self.scheduler.start()
+
+    def reload_config(self) -> None:
+        """Reads config.ini again if it was edited, the listeners are told about the change"""
+        self.config.reload_if_changed()
+
+    def stop(self) -> None:
+        """Stops all background work and stores the snapshot for the next launch"""
+        self.scheduler.stop()
+        self.commands.shutdown()
+        if self.stream is not None:
+            self.stream.stop()
+        if not self.poller.stale:
+            self.save_snapshot()
+
+    def fetch(self) -> None:
+        """Fetches the entity states and the entities of grouped areas once and in parallel, the services are loaded on first use"""
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            states = pool.submit(self.poller.poll)
+            areas = pool.submit(self.groups.load_areas, self.config.groups)
+            states.result()
+            areas.result()
+
+    def revalidate(self) -> None:
+        """Replaces the snapshot data with fresh data from Home Assistant"""
+        self.fetch()
+        if self.domains.loaded:
+            self.domains.load()
+        self.save_snapshot()
+
+        # entities that were added to a configured domain since the snapshot was taken
+        self.on_reconcile()
+
+    @staticmethod
+    def poll_policy(config: Config) -> PollPolicy:
+        """Builds the polling policy from the config"""
+        return PollPolicy(config.update_interval, config.update_interval_max, config.update_backoff, config.fast_poll_interval, config.fast_poll_window)
+
+    def apply_config(self) -> None:
+        """Applies the current config to the running engine"""
+        config = self.config
+        metrics.enabled = config.diagnostics
+        self.poller.policy = self.poll_policy(config)
+        self.commands.coalescer.min_interval = config.command_interval
+        self.apply_update_mode()
+
+    def apply_update_mode(self) -> None:
+        """Starts the WebSocket stream or the poll job, depending on the config"""
+        if self.config.push_updates:
+            if self.poll_job is not None:
+                self.poll_job.cancel()
+                self.poll_job = None
+            if self.stream is None:
+                # Home Assistant pushes every change, the poller is only used to resync after a disconnect
+                if getattr(sys, 'frozen', False):
+                    from hometray.push import StateStream  # pylint: disable=import-outside-toplevel,redefined-outer-name
+                else:
+                    from push import StateStream  # type:ignore  # pylint: disable=import-outside-toplevel,redefined-outer-name
+                self.stream = StateStream(self.config.api_url, self.config.token, self.poller, health=self.health)
+                self.stream.start()
+        else:
+            if self.stream is not None:
+                self.stream.stop()
+                self.stream = None
+            if self.poll_job is None:
+                self.poll_job = self.scheduler.every(self.poller.policy.fast_interval, self.poller.tick)
+            else:
+                self.scheduler.reschedule(self.poll_job, self.poller.policy.fast_interval)
+
+    def on_health_changed(self, available: bool) -> None:
+        """Pauses polling and probes Home Assistant while it is unreachable, resyncs everything once it is back"""
+        self.poller.offline = not available
+        if available:
+            print('Home Assistant is reachable again')
+            if self.probe_job is not None:
+                self.probe_job.cancel()
+                self.probe_job = None
+            self.scheduler.call_soon(self.revalidate)
+        else:
+            print('Home Assistant is unreachable, probing it in the background')
+            delay = self.health.delay
+            self.probe_job = self.scheduler.every(delay, self.probe, jitter=0.2)
+            self.scheduler.reschedule(self.probe_job, delay, delay=delay)
+
+        self.on_redraw()
+
+    def probe(self) -> None:
+        """Sends a single request to Home Assistant, backing off further if it still fails"""
+        if not self.client.probe() and self.probe_job is not None:
+            self.scheduler.reschedule(self.probe_job, self.health.delay)
+
+    def write_metrics(self) -> None:
+        """Writes the Prometheus text file, if one is configured"""
+        if metrics.enabled and self.config.metrics_file:
+            metrics.write(self.config.metrics_file)
+
+    def save_snapshot(self) -> None:
+        """Stores the current states and services for the next launch"""
+        try:
+            self.snapshot.save(self.poller.to_json(), self.domains.to_json())
+        except OSError as e:
+            print('Could not save snapshot:', e)
+
+    def select_groups(self) -> dict[str, list[str]]:
+        """Returns the members of all configured groups, based on the already fetched states"""
+        config = self.config
+        known_entity_ids = list(self.poller.states)
+        groups = {name: self.groups.resolve(members, known_entity_ids) for name, members in config.groups.items()}
+        if config.group_domains:
+            for domain in config.domains:
+                groups.setdefault(domain.title(), [full_id for full_id in self.poller.entity_ids(domain) if full_id not in config.domain_entities_ignore])
+        return groups
+
+    def select_entities(self) -> list[str]:
+        """Returns the ids of all selected entities that aren't part of a group, based on the already fetched states"""
+        config = self.config
+        grouped = {entity_id for entity_ids in self.select_groups().values() for entity_id in entity_ids}
+        entity_ids = []
+        if not config.group_domains:
+            for domain in config.domains:
+                for full_id in self.poller.entity_ids(domain):
+                    if full_id in config.domain_entities_ignore or full_id in config.entities or full_id in grouped:
+                        continue
+                    entity_ids.append(full_id)
+
+        return entity_ids + [entity_id for entity_id in config.entities if entity_id not in grouped]
@@ -0,0 +1,70 @@
+"""Compact entity states"""
+from __future__ import annotations
+
+import sys
+from typing import Any
+
+
+class EntityState:
+    """
+    The parts of an entity state HomeTray shows, parsed straight from the JSON of the REST or WebSocket API.
+    All other attributes are dropped, so hundreds of entities stay small and a poll doesn't build full models.
+    Ids, states and icons are interned, the few distinct values are shared by all entities.
+    """
+
+    __slots__ = ('entity_id', 'state', 'icon', 'friendly_name', 'rgb_color')
+
+    def __init__(self, entity_id: str, state: str, icon: str | None = None, friendly_name: str | None = None, rgb_color: tuple[int, ...] | None = None) -> None:
+        self.entity_id: str = entity_id
+        self.state: str = state
+        self.icon: str | None = icon
+        self.friendly_name: str | None = friendly_name
+        self.rgb_color: tuple[int, ...] | None = rgb_color
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> EntityState:
+        """Extracts the state from the format of /api/states"""
+        attributes = data.get('attributes') or {}
+        icon = attributes.get('icon')
+        rgb_color = attributes.get('rgb_color')
+        return cls(
+            sys.intern(data['entity_id']),
+            sys.intern(str(data['state'])),
+            sys.intern(icon) if isinstance(icon, str) else None,
+            attributes.get('friendly_name'),
+            tuple(rgb_color) if rgb_color is not None else None,
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        """Returns the state in the format of /api/states, with only the kept attributes"""
+        attributes: dict[str, Any] = {}
+        if self.icon is not None:
+            attributes['icon'] = self.icon
+        if self.friendly_name is not None:
+            attributes['friendly_name'] = self.friendly_name
+        if self.rgb_color is not None:
+            attributes['rgb_color'] = list(self.rgb_color)
+        return {'entity_id': self.entity_id, 'state': self.state, 'attributes': attributes}
+
+    @property
+    def domain(self) -> str:
+        return self.entity_id.split('.', 1)[0]
+
+    @property
+    def name(self) -> str:
+        """The friendly name, or the entity id if there is none"""
+        return self.friendly_name if self.friendly_name is not None else self.entity_id
+
+    def replace(self, **changes: Any) -> EntityState:
+        """Returns a copy with the given fields changed, e.g. to show the expected state of a toggle"""
+        fields = {field: getattr(self, field) for field in self.__slots__}
+        fields.update(changes)
+        return EntityState(**fields)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, EntityState):
+            return NotImplemented
+        return (self.state, self.icon, self.friendly_name, self.rgb_color, self.entity_id) == (other.state, other.icon, other.friendly_name, other.rgb_color, other.entity_id)
+
+    def __repr__(self) -> str:
+        return f'EntityState({self.entity_id!r}, {self.state!r})'
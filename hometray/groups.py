@@ -0,0 +1,91 @@
+"""Groups of entities that share one aggregated tray icon"""
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import homeassistant_api as ha
+
+
+class GroupResolver:
+    """
+    Expands the members of a group to entity ids. A member is an entity id,
+    domain:<domain> for all entities of a domain or area:<area> for all entities in an area.
+    """
+
+    def __init__(self, client: ha.Client) -> None:
+        super().__init__()
+        self.client: ha.Client = client
+        self.areas: dict[str, list[str]] = {}
+
+    def load_areas(self, groups: dict[str, list[str]]) -> None:
+        """Fetches the entities of the areas used by the groups, the REST API only exposes them through templates"""
+        names = {member[len('area:'):] for members in groups.values() for member in members if member.startswith('area:')}
+        for name in names:
+            try:
+                rendered = self.client.get_rendered_template(f"{{{{ area_entities({json.dumps(name)}) | join(',') }}}}")
+            except Exception as e:  # pylint: disable=broad-except
+                print(f'Could not load the entities of area {name}:', e)
+                continue
+            self.areas[name] = [entity_id for entity_id in rendered.split(',') if entity_id != '']
+
+    def resolve(self, members: list[str], known_entity_ids: list[str]) -> list[str]:
+        """Returns the entity ids of the group, in the configured order and without duplicates"""
+        entity_ids: dict[str, None] = {}
+        for member in members:
+            if member.startswith('domain:'):
+                prefix = f'{member[len("domain:"):]}.'
+                entity_ids.update(dict.fromkeys(entity_id for entity_id in known_entity_ids if entity_id.startswith(prefix)))
+            elif member.startswith('area:'):
+                entity_ids.update(dict.fromkeys(self.areas.get(member[len('area:'):], [])))
+            else:
+                entity_ids[member] = None
+        return list(entity_ids)
+
+
+class GroupSummary:
+    """Counts how many members of a group are on, updated per changed member instead of scanning the group"""
+
+    __slots__ = ('states', 'on', 'off')
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.states: dict[str, str] = {}
+        self.on: int = 0
+        self.off: int = 0
+
+    def update(self, entity_id: str, state: str) -> bool:
+        """Records the state of a member, returns whether the summary changed"""
+        previous = self.states.get(entity_id)
+        if previous == state:
+            return False
+        self._count(previous, -1)
+        self._count(state, 1)
+        self.states[entity_id] = state
+        return True
+
+    def remove(self, entity_id: str) -> None:
+        self._count(self.states.pop(entity_id, None), -1)
+
+    def _count(self, state: str | None, delta: int) -> None:
+        if state == 'on':
+            self.on += delta
+        elif state == 'off':
+            self.off += delta
+
+    @property
+    def total(self) -> int:
+        return len(self.states)
+
+    @property
+    def state(self) -> str:
+        """on if any member is on, off if all known members are off, unavailable otherwise"""
+        if self.on:
+            return 'on'
+        if self.off:
+            return 'off'
+        return 'unavailable'
+
+    def describe(self) -> str:
+        return f'{self.on} of {self.total} on'
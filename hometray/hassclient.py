@@ -0,0 +1,71 @@
+"""The Home Assistant API client used by HomeTray"""
+from __future__ import annotations
+
+import sys
+from typing import Any
+
+import homeassistant_api as ha
+import requests
+from homeassistant_api.errors import HomeassistantAPIError
+from homeassistant_api.errors import InternalServerError
+from homeassistant_api.errors import RequestTimeoutError
+
+if getattr(sys, 'frozen', False):
+    from hometray.health import ConnectionHealth
+    from hometray.metrics import metrics
+    from hometray.transport import PooledSession
+else:
+    from health import ConnectionHealth  # type:ignore
+    from metrics import metrics  # type:ignore
+    from transport import PooledSession  # type:ignore
+
+# errors that mean Home Assistant can't be reached, as opposed to it rejecting a request
+_UNREACHABLE = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, RequestTimeoutError, InternalServerError)
+
+
+class HassClient(ha.Client):
+    """
+    A homeassistant_api client on a pooled keep-alive transport that records the latency of every request.
+    Requests fail fast with CircuitOpenError while Home Assistant is unreachable, see ConnectionHealth.
+    """
+
+    def __init__(self, api_url: str, token: str, pool_size: int = 10, timeout: float | tuple[float, float] = (3.05, 10), dedup_window: float = 0.05, health: ConnectionHealth | None = None, **kwargs: Any) -> None:
+        kwargs.setdefault('cache_session', PooledSession(pool_size, timeout, dedup_window))
+        super().__init__(api_url, token, **kwargs)
+        self.health: ConnectionHealth = ConnectionHealth() if health is None else health
+
+    def request(self, path: str, method: str = 'GET', headers: dict[str, str] | None = None, decode_bytes: bool = True, **kwargs: Any) -> Any:
+        self.health.check()
+        try:
+            response = self._request(path, method, headers, decode_bytes, **kwargs)
+        except _UNREACHABLE:
+            self.health.record_failure()
+            raise
+        except (Exception, HomeassistantAPIError):
+            # Home Assistant answered, it just didn't like the request
+            self.health.record_success()
+            raise
+        self.health.record_success()
+        return response
+
+    def probe(self) -> bool:
+        """Checks whether Home Assistant is reachable again, also while the circuit is open"""
+        try:
+            with self.health.probe():
+                self.check_api_running()
+        except (Exception, HomeassistantAPIError):
+            pass
+        return self.health.available
+
+    def _request(self, path: str, method: str, headers: dict[str, str] | None, decode_bytes: bool, **kwargs: Any) -> Any:
+        if not metrics.enabled:
+            return super().request(path, method, headers, decode_bytes, **kwargs)
+
+        # e.g. states/light.desk -> states, so the number of label values stays small
+        endpoint = path.split('/', 1)[0] or 'api'
+        try:
+            with metrics.timer('hometray_request_seconds', method=method, endpoint=endpoint):
+                return super().request(path, method, headers, decode_bytes, **kwargs)
+        except (Exception, HomeassistantAPIError):
+            metrics.inc('hometray_request_errors_total', method=method, endpoint=endpoint)
+            raise
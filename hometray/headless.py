@@ -0,0 +1,219 @@
+"""Runs the engine without a display, streaming the states as JSON lines"""
+from __future__ import annotations
+
+import contextlib
+import json
+import sys
+import threading
+from typing import Any
+from typing import TextIO
+
+if getattr(sys, 'frozen', False):
+    from hometray.bulk import call_service_bulk
+    from hometray.config import Config
+    from hometray.display import entity_display
+    from hometray.display import group_display
+    from hometray.engine import Engine
+    from hometray.entitystate import EntityState
+    from hometray.groups import GroupSummary
+    from hometray.startup import profile
+else:
+    from bulk import call_service_bulk  # type:ignore
+    from config import Config  # type:ignore
+    from display import entity_display  # type:ignore
+    from display import group_display  # type:ignore
+    from engine import Engine  # type:ignore
+    from entitystate import EntityState  # type:ignore
+    from groups import GroupSummary  # type:ignore
+    from startup import profile  # type:ignore
+
+SERVICES = ('toggle', 'turn_on', 'turn_off')
+
+
+def parse_command(line: str) -> tuple[str, list[str]] | None:
+    """
+    Parses a command read from stdin, either as JSON like {"service": "toggle", "entity_id": "light.desk"}
+    or as text like `toggle light.desk light.bed`. Returns the service and the entity ids, or None for quit.
+    """
+    line = line.strip()
+    if line.startswith('{'):
+        command = json.loads(line)
+        service = command.get('service', '')
+        entity_ids = command.get('entity_id', [])
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+    else:
+        service, *entity_ids = line.split()
+
+    if service == 'quit':
+        return None
+    if service not in SERVICES:
+        raise ValueError(f'Unknown service {service!r}, expected one of {", ".join(SERVICES)} or quit')
+    if not entity_ids:
+        raise ValueError(f'No entity given for {service}')
+    return service, entity_ids
+
+
+class HeadlessApp:
+    """
+    Tracks the same entities and groups as the tray app and writes every change as one JSON object per line.
+    Log messages go to stderr, so stdout only carries the events.
+    """
+
+    def __init__(self, config: Config, out: TextIO = sys.stdout) -> None:
+        super().__init__()
+        self.config: Config = config
+        self.out: TextIO = out
+        self.engine: Engine = Engine(config, on_reconcile=self.reconcile, on_redraw=self.redraw)
+        self.entity_ids: list[str] = []
+        self.groups: dict[str, list[str]] = {}
+        self.summaries: dict[str, GroupSummary] = {}
+        self.stopped: threading.Event = threading.Event()
+
+        self._out_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # the groups each entity is a member of
+        self._member_of: dict[str, list[str]] = {}
+
+    def emit(self, event: dict[str, Any]) -> None:
+        """Writes one event line, can be called from any thread"""
+        line = json.dumps(event, separators=(',', ':'))
+        with self._out_lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def on_state(self, state: EntityState) -> None:
+        """Emits the changed entity and the groups whose summary changed through it"""
+        with self._lock:
+            watched = state.entity_id in self.entity_ids
+            groups = [name for name in self._member_of.get(state.entity_id, []) if self.summaries[name].update(state.entity_id, state.state)]
+
+        if watched:
+            self.emit_entity(state)
+        for name in groups:
+            self.emit_group(name)
+
+    def emit_entity(self, state: EntityState) -> None:
+        poller = self.engine.poller
+        display = entity_display(state, self.config, poller.stale, poller.offline)
+        self.emit({'type': 'state', 'entity_id': state.entity_id, 'state': display.state, 'icon': display.icon, 'color': display.color, 'tooltip': display.tooltip})
+
+    def emit_group(self, name: str) -> None:
+        poller = self.engine.poller
+        with self._lock:
+            summary = self.summaries.get(name)
+            if summary is None:
+                return
+            display = group_display(name, summary, 'default', self.config, poller.stale, poller.offline)
+            event = {'type': 'group', 'name': name, 'state': display.state, 'on': summary.on, 'total': summary.total, 'tooltip': display.tooltip}
+        self.emit(event)
+
+    def subscribe(self) -> None:
+        """Subscribes to the selected entities and group members, only touching what changed"""
+        engine = self.engine
+        entity_ids = engine.select_entities()
+        groups = engine.select_groups()
+
+        with self._lock:
+            previous = dict.fromkeys([*self.entity_ids, *self._member_of])
+            self.entity_ids = entity_ids
+            self.groups = groups
+            self.summaries = {name: self.summaries.get(name, GroupSummary()) for name in groups}
+            self._member_of = {}
+            # the summaries are filled from the known states first, so a group is emitted once instead of once per member
+            changed = set()
+            for name, members in groups.items():
+                summary = self.summaries[name]
+                for entity_id in members:
+                    self._member_of.setdefault(entity_id, []).append(name)
+                    state = engine.poller.states.get(entity_id)
+                    if state is not None and summary.update(entity_id, state.state):
+                        changed.add(name)
+                for entity_id in list(summary.states):
+                    if entity_id not in members:
+                        summary.remove(entity_id)
+                        changed.add(name)
+            # in the order of the config, like the tray icons
+            current = dict.fromkeys([*entity_ids, *self._member_of])
+
+        for entity_id in previous:
+            if entity_id not in current:
+                engine.poller.unsubscribe(entity_id, self.on_state)
+        for entity_id in current:
+            if entity_id not in previous:
+                engine.poller.subscribe(entity_id, self.on_state)
+        for name in changed:
+            self.emit_group(name)
+
+    def reconcile(self) -> None:
+        """Applies the current config, e.g. after config.ini was edited"""
+        self.engine.apply_config()
+        self.subscribe()
+
+    def redraw(self) -> None:
+        """Emits the health of the connection and every state again, e.g. after Home Assistant became unreachable"""
+        poller = self.engine.poller
+        self.emit({'type': 'health', 'available': not poller.offline})
+        for entity_id in list(self.entity_ids):
+            state = poller.states.get(entity_id)
+            if state is not None:
+                self.emit_entity(state)
+        for name in list(self.groups):
+            self.emit_group(name)
+
+    def handle(self, line: str) -> None:
+        """Runs a command read from stdin, errors are emitted as events"""
+        try:
+            command = parse_command(line)
+        except ValueError as e:
+            self.emit({'type': 'error', 'error': str(e)})
+            return
+        if command is None:
+            # the commands read before quit still run, they are executed in order
+            self.engine.commands.submit(lambda: None).result()
+            self.stopped.set()
+            return
+
+        service, entity_ids = command
+        engine = self.engine
+        engine.commands.submit(lambda: call_service_bulk(engine.domains, engine.poller, service, entity_ids), on_error=lambda e: self.emit({'type': 'error', 'error': str(e), 'service': service, 'entity_ids': entity_ids}))
+
+    def read_commands(self, commands: TextIO) -> None:
+        """Reads commands until quit or the end of the input, the engine keeps running after the end of the input"""
+        for line in commands:
+            if line.strip():
+                self.handle(line)
+            if self.stopped.is_set():
+                return
+
+    def run(self, commands: TextIO = sys.stdin) -> int:
+        """Starts the engine and runs until quit is read or the process is interrupted"""
+        self.engine.load()
+        profile.mark('states loaded')
+        self.subscribe()
+        self.engine.start()
+        self.emit({'type': 'ready', 'entities': len(self.entity_ids), 'groups': len(self.groups)})
+        profile.finish('ready')
+
+        reader = threading.Thread(target=self.read_commands, args=(commands,), name='HeadlessCommands', daemon=True)
+        reader.start()
+        try:
+            while not self.stopped.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.engine.stop()
+        return 0
+
+
+def main() -> int:
+    """Entry point of `python -m hometray --headless`"""
+    config = Config.load()
+    if not config.api_url or not config.token:
+        print('ApiUrl and Token have to be set in config.ini to run headless', file=sys.stderr)
+        return 1
+
+    out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return HeadlessApp(config, out).run()
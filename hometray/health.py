@@ -0,0 +1,82 @@
+"""Tracks whether Home Assistant is reachable"""
+from __future__ import annotations
+
+import contextlib
+import threading
+from collections.abc import Iterator
+from typing import Callable
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while Home Assistant is unreachable"""
+
+
+class ConnectionHealth:
+    """
+    A circuit breaker for the connection to Home Assistant.
+    After failure_threshold consecutive failed requests the circuit opens and every request
+    fails immediately instead of waiting for a connect timeout. While it is open only probes
+    are sent, one at a time; the delay between them doubles up to max_delay with every failed probe.
+    The first successful request closes the circuit again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, base_delay: float = 2.0, max_delay: float = 120.0) -> None:
+        super().__init__()
+        self.failure_threshold: int = failure_threshold
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        # seconds until the next probe should be sent
+        self.delay: float = base_delay
+        self.failures: int = 0
+        self.available: bool = True
+
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._probing = threading.local()
+        self._listeners: list[Callable[[bool], None]] = []
+
+    def add_listener(self, listener: Callable[[bool], None]) -> None:
+        """Registers a callback that is invoked with the new availability when the circuit opens or closes"""
+        self._listeners.append(listener)
+
+    def check(self) -> None:
+        """Raises CircuitOpenError if a request must not be sent right now"""
+        if not self.available and not getattr(self._probing, 'active', False):
+            raise CircuitOpenError('Home Assistant is unreachable')
+
+    @contextlib.contextmanager
+    def probe(self) -> Iterator[None]:
+        """Lets the requests of the with block through while the circuit is open, only one probe runs at a time"""
+        if not self._probe_lock.acquire(blocking=False):
+            raise CircuitOpenError('Home Assistant is already being probed')
+        self._probing.active = True
+        try:
+            yield
+        finally:
+            self._probing.active = False
+            self._probe_lock.release()
+
+    def record_success(self) -> None:
+        with self._lock:
+            recovered = not self.available
+            self.available = True
+            self.failures = 0
+            self.delay = self.base_delay
+        if recovered:
+            self._notify(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if not self.available:
+                self.delay = min(self.delay * 2, self.max_delay)
+                return
+            if self.failures < self.failure_threshold:
+                return
+            self.available = False
+            self.delay = self.base_delay
+        self._notify(False)
+
+    def _notify(self, available: bool) -> None:
+        for listener in self._listeners:
+            listener(available)
@@ -0,0 +1,100 @@
+"""In-memory index of the available icon files"""
+from __future__ import annotations
+
+import threading
+import zipfile
+from pathlib import Path
+
+
+class IconAsset:
+    """An icon file, either in a directory or inside a zip archive"""
+
+    __slots__ = ('source', 'member')
+
+    def __init__(self, source: Path, member: str | None = None) -> None:
+        super().__init__()
+        self.source: Path = source
+        self.member: str | None = member
+
+    def __repr__(self) -> str:
+        return f'IconAsset({self.source}, {self.member})' if self.member else f'IconAsset({self.source})'
+
+    def read(self) -> bytes:
+        """Returns the content of the icon file"""
+        if self.member is None:
+            return self.source.read_bytes()
+        return _ArchiveReader.read(self.source, self.member)
+
+
+class _ArchiveReader:
+    """Keeps icon archives open, so reading a member doesn't parse the archive directory again"""
+
+    _archives: dict[Path, zipfile.ZipFile] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def read(cls, path: Path, member: str) -> bytes:
+        with cls._lock:
+            if path not in cls._archives:
+                cls._archives[path] = zipfile.ZipFile(path)
+            return cls._archives[path].read(member)
+
+
+class IconIndex:
+    """
+    Maps (icon name, state) to an icon file.
+    The icon packs are scanned once, resolving an icon afterwards is a dict lookup.
+    Earlier packs take precedence over later ones.
+    """
+
+    fallback_states: list[str] = ['on', 'off', 'unavailable']
+    # file name suffixes that are read as the state an icon is drawn for, e.g. mdi-lamp-on.svg
+    states: frozenset[str] = frozenset(['on', 'off', 'unavailable', 'unknown'])
+
+    def __init__(self, packs: list[Path]) -> None:
+        super().__init__()
+        self._assets: dict[tuple[str, str], IconAsset] = {}
+        self._resolved: dict[tuple[str, str], IconAsset] = {}
+        for pack in packs:
+            self._scan(pack)
+
+    def __len__(self) -> int:
+        return len(self._assets)
+
+    def _scan(self, pack: Path) -> None:
+        if pack.is_dir():
+            for path in sorted(pack.glob('*.svg')):
+                self._add(path.stem, IconAsset(path))
+            # archives shipped inside a pack, e.g. the full MDI set, are indexed after the loose files
+            for path in sorted(pack.glob('*.zip')):
+                self._scan(path)
+        elif zipfile.is_zipfile(pack):
+            with zipfile.ZipFile(pack) as archive:
+                for member in archive.namelist():
+                    if member.endswith('.svg'):
+                        self._add(Path(member).stem, IconAsset(pack, member))
+
+    def _add(self, stem: str, asset: IconAsset) -> None:
+        name, _, state = stem.rpartition('-')
+        if name and state in self.states:
+            self._assets.setdefault((name, state), asset)
+        # also as a stateless icon, MDI has icons like mdi-lightbulb-off next to mdi-lightbulb
+        self._assets.setdefault((stem, ''), asset)
+
+    def resolve(self, icon_name: str, state: str) -> IconAsset:
+        """Returns the icon file for the entity icon and state, falling back to the default and unknown icons"""
+        key = (icon_name, state)
+        asset = self._resolved.get(key)
+        if asset is None:
+            asset = self._resolve(icon_name.replace(':', '-').lower(), state.lower())
+            self._resolved[key] = asset
+        return asset
+
+    def _resolve(self, icon_name: str, state: str) -> IconAsset:
+        # a stateless icon is preferred over another state of the icon, in an MDI pack mdi-lightbulb-off is a different icon
+        candidates = [(icon_name, state), (icon_name, '')] + [(icon_name, fallback) for fallback in self.fallback_states] + [('default', state), ('unknown', '')]
+        for candidate in candidates:
+            if candidate in self._assets:
+                return self._assets[candidate]
+
+        raise FileNotFoundError(f'No icon found for {icon_name} ({state}) and no unknown.svg fallback')
@@ -1,12 +1,35 @@
 """Everything related to icons"""
 from __future__ import annotations
 
+import contextlib
 import os
-import re
+import struct
 import sys
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
 import wx
-import wx.svg
+
+if getattr(sys, 'frozen', False):
+    from hometray.bitmapcache import BitmapCache
+    from hometray.bitmapcache import quantize_color
+    from hometray.iconindex import IconAsset
+    from hometray.iconindex import IconIndex
+    from hometray.metrics import metrics
+    from hometray.svgtemplate import SvgTemplate
+else:
+    from bitmapcache import BitmapCache  # type:ignore
+    from bitmapcache import quantize_color  # type:ignore
+    from iconindex import IconAsset  # type:ignore
+    from iconindex import IconIndex  # type:ignore
+    from metrics import metrics  # type:ignore
+    from svgtemplate import SvgTemplate  # type:ignore
+
+if TYPE_CHECKING:
+    import wx.svg
 
 
 class PathHelper:
@@ -21,58 +44,210 @@ class PathHelper:
         else:
             base_path = Path(os.path.abspath('.'))
 
-        res = base_path / Path(relative_path)
-        print(base_path, relative_path, res)
-        return res
+        return base_path / Path(relative_path)
 
-class IconManager:
-    """Manages icon handles for the application"""
-    icon_handles: dict[str, dict[str, dict[str, wx.Bitmap]]] = {}
 
-    _icon_base: Path = PathHelper.to_absolute_path('icons')
+class RasterCache:
+    """
+    Stores rendered icons as PNG files, so they survive restarts of the application.
+    The files are written on a background thread. Once they take more than max_bytes,
+    the least recently used ones are deleted.
+    """
 
-    def _get_icon_path(self, icon_name: str, state: str) -> str:
-        icon_name = icon_name.replace(':', '-').lower()
-        state = state.lower()
+    def __init__(self, directory: str | Path, max_bytes: int = 16 * 1024 * 1024) -> None:
+        super().__init__()
+        self.directory: Path = Path(directory)
+        self.max_bytes: int = max_bytes
+        self._writer: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='RasterCache')
+        # file name -> size, least recently used first, read from the directory on the first write
+        self._files: OrderedDict[str, int] | None = None
+        self._size: int = 0
+        self._lock = threading.Lock()
 
-        icon_path = f'{self._icon_base}/{icon_name}-{state}.svg'
-        if os.path.isfile(icon_path):
-            return icon_path
+    @staticmethod
+    def key(content_hash: str, state: str, color: list[int], size: int) -> str:
+        """Builds the cache key from the hash of the icon file content and the render parameters"""
+        color_hex = ''.join(f'{c:02x}' for c in color)
+        return f'{content_hash}-{state}-{color_hex}-{size}'
+
+    def contains(self, key: str) -> bool:
+        """Checks whether an icon has been stored before, without loading it"""
+        return (self.directory / f'{key}.png').is_file()
+
+    def get(self, key: str) -> wx.Bitmap | None:
+        """Loads a rendered icon, if it has been stored before"""
+        path = self.directory / f'{key}.png'
+        if not path.is_file():
+            return None
+
+        bitmap = wx.Bitmap(str(path), wx.BITMAP_TYPE_PNG)
+        if not bitmap.IsOk():
+            return None
+        self._touch(path)
+        return bitmap
+
+    def put(self, key: str, buffer: bytes, size: int) -> None:
+        """Stores a rendered icon from its RGBA pixels in the background"""
+        self._writer.submit(self._write, key, buffer, size)
+
+    def close(self) -> None:
+        """Waits for the icons that are still being written"""
+        self._writer.shutdown(wait=True)
+
+    def _write(self, key: str, buffer: bytes, size: int) -> None:
+        path = self.directory / f'{key}.png'
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            data = encode_png(buffer, size, size)
+            temp_path = self.directory / f'{key}.png.tmp'
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print('Could not store rendered icon:', e)
+            return
+
+        with self._lock:
+            files = self._index()
+            self._size += len(data) - files.pop(path.name, 0)
+            files[path.name] = len(data)
+            while self._size > self.max_bytes and len(files) > 1:
+                name, file_size = files.popitem(last=False)
+                self._size -= file_size
+                with contextlib.suppress(OSError):
+                    os.unlink(self.directory / name)
+
+    def _touch(self, path: Path) -> None:
+        # the modification time orders the files after a restart
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        with self._lock:
+            if self._files is not None and path.name in self._files:
+                self._files.move_to_end(path.name)
+
+    def _index(self) -> OrderedDict[str, int]:
+        if self._files is None:
+            stats: list[tuple[str, os.stat_result]] = []
+            with contextlib.suppress(OSError):
+                stats = [(path.name, path.stat()) for path in self.directory.glob('*.png')]
+            stats.sort(key=lambda item: item[1].st_mtime_ns)
+            self._files = OrderedDict((name, stat.st_size) for name, stat in stats)
+            self._size = sum(self._files.values())
+        return self._files
+
+
+def encode_png(rgba: bytes, width: int, height: int) -> bytes:
+    """Encodes RGBA pixels as PNG, without wx, so it can run on any thread"""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    stride = width * 4
+    # every row starts with its filter type, 0 is none
+    rows = b''.join(b'\0' + rgba[y * stride:(y + 1) * stride] for y in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+IconVariant = tuple[str, str, list[int]]
 
-        default_states = ['on', 'off', 'unavailable']
-        for fallback_state in default_states:
-            icon_path = f'{self._icon_base}/{icon_name}-{fallback_state}.svg'
-            if os.path.isfile(icon_path):
-                return icon_path
 
-        print('Icon not found:', icon_path)
-        default_path = f'{self._icon_base}/default-{state}.svg'
-        if os.path.isfile(default_path):
-            return default_path
+class IconManager:
+    """Manages icon handles for the application"""
 
-        return f'{self._icon_base}/unknown.svg'
+    def __init__(self, raster_cache: RasterCache | None = None, cache_budget: int = 8 * 1024 * 1024, color_quantization: int = 0, icon_packs: list[Path] | None = None) -> None:
+        """Has to be created on the UI thread, as it reads the taskbar size"""
+        super().__init__()
+        # additional icon packs (directories or zip archives) take precedence over the bundled icons
+        self.index: IconIndex = IconIndex((icon_packs or []) + [PathHelper.to_absolute_path('icons')])
+        self.raster_cache: RasterCache | None = raster_cache
+        self.icon_handles: BitmapCache[wx.Bitmap] = BitmapCache(cache_budget)
+        self.color_quantization: int = color_quantization
+        self.size: int = wx.GetClientDisplayRect().GetPosition().y
 
-    def _rgb_to_hex(self, rgb: list[int]) -> str:
-        r, g, b = rgb
-        return f'#{r:02x}{g:02x}{b:02x}'
+        self._templates: dict[IconAsset, SvgTemplate] = {}
+        self._templates_lock = threading.Lock()
 
     def get_icon(self, icon_name: str, state: str, color: list[int]) -> wx.Bitmap:
-        """Get the colored icon for the given entity and state"""
-
-        if not self.icon_handles.get(icon_name, {}).get(state, {}).get(str(color)):
-            icon_path = self._get_icon_path(icon_name, state)
-
-            with open(icon_path, encoding='utf8') as f:
-                icon_data = f.read()
-                icon_data = re.sub(r'fill="#[0-9a-f]{3,6}"', f'fill="{self._rgb_to_hex(color)}"', icon_data)
-
-            taskbar_height = wx.GetClientDisplayRect().GetPosition().y
-
-            svg: wx.svg.SVGimage = wx.svg.SVGimage.CreateFromBytes(icon_data.encode(), units='px', dpi=300, do_copy=False)
-            icon: wx.Bitmap = svg.ConvertToScaledBitmap(wx.Size(taskbar_height, taskbar_height))
-
-            self.icon_handles.setdefault(icon_name, {})
-            self.icon_handles[icon_name].setdefault(state, {})
-            self.icon_handles[icon_name][state].setdefault(str(color), icon)
-
-        return self.icon_handles[icon_name][state][str(color)]
+        """Get the colored icon for the given entity and state, has to be called on the UI thread"""
+
+        color = quantize_color(color, self.color_quantization)
+        handle_key = (icon_name, state, tuple(color))
+        icon: wx.Bitmap | None = self.icon_handles.get(handle_key)
+
+        if icon is None:
+            template = self._template(icon_name, state)
+            cache_key = RasterCache.key(template.content_hash, state, color, self.size)
+            icon = self.raster_cache.get(cache_key) if self.raster_cache is not None else None
+            if icon is None:
+                metrics.inc('hometray_icon_cache_total', result='miss')
+                icon = self._store(icon_name, state, color, self._rasterize(template, color))
+            else:
+                metrics.inc('hometray_icon_cache_total', result='disk')
+                self._add_handle(handle_key, icon)
+        else:
+            metrics.inc('hometray_icon_cache_total', result='hit')
+
+        return icon
+
+    def prerender(self, variants: list[IconVariant], workers: int = 4) -> None:
+        """
+        Renders the given (icon name, state, colour) variants in parallel.
+        The SVGs are rasterized on a worker pool, only the bitmaps are created here,
+        so this has to be called on the UI thread.
+        """
+        missing: dict[tuple[str, str, tuple[int, ...]], IconVariant] = {}
+        for icon_name, state, color in variants:
+            color = quantize_color(color, self.color_quantization)
+            handle_key = (icon_name, state, tuple(color))
+            if handle_key not in missing and self.icon_handles.get(handle_key) is None:
+                missing[handle_key] = (icon_name, state, color)
+
+        def render(variant: IconVariant) -> bytes | None:
+            icon_name, state, color = variant
+            template = self._template(icon_name, state)
+            if self.raster_cache is not None and self.raster_cache.contains(RasterCache.key(template.content_hash, state, color, self.size)):
+                return None
+            return self._rasterize(template, color)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='IconRenderer') as pool:
+            buffers = list(pool.map(render, missing.values()))
+
+        for (icon_name, state, color), buffer in zip(missing.values(), buffers):
+            if buffer is None:
+                self.get_icon(icon_name, state, color)
+            else:
+                self._store(icon_name, state, color, buffer)
+
+    def _template(self, icon_name: str, state: str) -> SvgTemplate:
+        asset = self.index.resolve(icon_name, state)
+        template = self._templates.get(asset)
+        if template is None:
+            template = SvgTemplate(asset.read())
+            with self._templates_lock:
+                template = self._templates.setdefault(asset, template)
+        return template
+
+    def _rasterize(self, template: SvgTemplate, color: list[int]) -> bytes:
+        """Renders the template to RGBA pixels, this doesn't touch any GUI objects and can run on any thread"""
+        # the SVG renderer is only loaded once an icon isn't in the raster cache
+        import wx.svg  # pylint: disable=import-outside-toplevel,redefined-outer-name
+
+        with metrics.timer('hometray_icon_render_seconds'):
+            svg: wx.svg.SVGimage = wx.svg.SVGimage.CreateFromBytes(template.render(color), units='px', dpi=300, do_copy=True)
+
+            # fit and center the image like SVGimage.ConvertToScaledBitmap does
+            scale = min(self.size / svg.width, self.size / svg.height)
+            tx = (self.size - svg.width * scale) / 2
+            ty = (self.size - svg.height * scale) / 2
+            return bytes(svg.Rasterize(self.size, self.size, tx=tx, ty=ty, scale=scale))
+
+    def _store(self, icon_name: str, state: str, color: list[int], buffer: bytes) -> wx.Bitmap:
+        icon: wx.Bitmap = wx.Bitmap.FromBufferRGBA(self.size, self.size, buffer)
+        self._add_handle((icon_name, state, tuple(color)), icon)
+        if self.raster_cache is not None:
+            self.raster_cache.put(RasterCache.key(self._template(icon_name, state).content_hash, state, color, self.size), buffer, self.size)
+        return icon
+
+    def _add_handle(self, handle_key: tuple[str, str, tuple[int, ...]], icon: wx.Bitmap) -> None:
+        # accounted as 32 bit RGBA, which is what the native icon handle holds
+        self.icon_handles.put(handle_key, icon, icon.GetWidth() * icon.GetHeight() * 4)
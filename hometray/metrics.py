@@ -0,0 +1,153 @@
+"""Lightweight instrumentation of the polling and rendering pipeline"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+from pathlib import Path
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Counts observations in cumulative buckets, like a Prometheus histogram"""
+
+    buckets: tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile as the upper bound of the bucket it falls into"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics: Metrics, name: str, labels: Labels) -> None:
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.metrics._observe(self.name, self.labels, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """
+    Collects counters and latency histograms.
+    While disabled every call returns immediately, so the instrumentation can stay in place.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        super().__init__()
+        self.enabled: bool = enabled
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+        self._null_timer = contextlib.nullcontext()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increments a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Records a duration in seconds"""
+        if self.enabled:
+            self._observe(name, tuple(sorted(labels.items())), value)
+
+    def timer(self, name: str, **labels: str) -> contextlib.AbstractContextManager[object]:
+        """Measures the duration of a with block"""
+        if not self.enabled:
+            return self._null_timer
+        return _Timer(self, name, tuple(sorted(labels.items())))
+
+    def _observe(self, name: str, labels: Labels, value: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def summary(self) -> str:
+        """Returns a human readable overview"""
+        if not self.enabled:
+            return 'Diagnostics are disabled. Set Diagnostics = True in config.ini to collect them.'
+
+        lines = []
+        with self._lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                lines.append(
+                    f'{name}{_format_labels(labels)}: n={histogram.count} '
+                    f'avg={histogram.sum / histogram.count * 1000:.1f}ms '
+                    f'p50<={histogram.quantile(0.5) * 1000:g}ms p95<={histogram.quantile(0.95) * 1000:g}ms',
+                )
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{name}{_format_labels(labels)}: {value:g}')
+        return '\n'.join(lines) or 'Nothing recorded yet.'
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{name}{_format_labels(labels)} {value:g}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    bucket_labels = labels + (('le', '+Inf' if bound == float('inf') else f'{bound:g}'),)
+                    lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum:g}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename: str | Path) -> None:
+        """Writes the Prometheus text file atomically, e.g. for the node exporter textfile collector"""
+        if not self.enabled:
+            return
+        temp_filename = f'{filename}.tmp'
+        with open(temp_filename, 'w', encoding='utf8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_filename, filename)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+# shared by all modules, enabled by the App depending on the config
+metrics = Metrics()
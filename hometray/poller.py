@@ -0,0 +1,192 @@
+"""Central state polling for all tray icons"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import TYPE_CHECKING
+
+if getattr(sys, 'frozen', False):
+    from hometray.entitystate import EntityState
+    from hometray.metrics import metrics
+else:
+    from entitystate import EntityState  # type:ignore
+    from metrics import metrics  # type:ignore
+
+if TYPE_CHECKING:
+    import homeassistant_api as ha
+
+StateCallback = Callable[[EntityState], None]
+
+
+class PollPolicy:
+    """
+    Adaptive per-entity polling intervals.
+    Entities that don't change back off from min_interval towards max_interval,
+    entities that just changed or were interacted with are polled every
+    fast_interval seconds for fast_window seconds.
+    """
+
+    def __init__(self, min_interval: float = 5, max_interval: float = 60, backoff: float = 1.5, fast_interval: float = 1, fast_window: float = 10) -> None:
+        super().__init__()
+        self.min_interval: float = min_interval
+        self.max_interval: float = max(min_interval, max_interval)
+        self.backoff: float = max(1.0, backoff)
+        self.fast_interval: float = min(fast_interval, min_interval)
+        self.fast_window: float = fast_window
+
+    def next_interval(self, interval: float | None, changed: bool) -> float:
+        """Returns the interval to use after a state has been observed"""
+        if interval is None or changed:
+            return self.min_interval
+        return min(interval * self.backoff, self.max_interval)
+
+
+class StatePoller:
+    """Fetches the states of all entities in one request and fans changes out to subscribers"""
+
+    # fetching more than this many entities individually costs more than one bulk request
+    bulk_threshold: int = 2
+
+    def __init__(self, client: ha.Client, policy: PollPolicy | None = None) -> None:
+        super().__init__()
+        self.client: ha.Client = client
+        self.policy: PollPolicy = PollPolicy() if policy is None else policy
+        self.states: dict[str, EntityState] = {}
+        # set while the states come from a snapshot and have not been confirmed by Home Assistant yet
+        self.stale: bool = False
+        # set while Home Assistant is unreachable, polling is paused and the icons are shown as unavailable
+        self.offline: bool = False
+        self._subscribers: dict[str, list[StateCallback]] = {}
+        self._intervals: dict[str, float] = {}
+        self._next_due: dict[str, float] = {}
+        self._fast_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, entity_id: str, callback: StateCallback) -> None:
+        """Registers a callback that is invoked whenever the state of the entity changes"""
+        with self._lock:
+            self._subscribers.setdefault(entity_id, []).append(callback)
+            self._next_due.setdefault(entity_id, time.monotonic() + self.policy.min_interval)
+            state = self.states.get(entity_id)
+
+        if state is not None:
+            callback(state)
+
+    def unsubscribe(self, entity_id: str, callback: StateCallback) -> None:
+        """Removes a previously registered callback"""
+        with self._lock:
+            callbacks = self._subscribers.get(entity_id, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(entity_id, None)
+
+    def poll(self) -> None:
+        """Fetches all states in one request and notifies the subscribers of changed entities"""
+        metrics.inc('hometray_polls_total', kind='bulk')
+        # parsed from the raw response, building the full models of all entities costs more than the request
+        states = [EntityState.from_json(data) for data in self.client.request('states')]
+
+        # after a snapshot every subscriber is notified once, to drop the stale marker
+        force, self.stale = self.stale, False
+        for state in states:
+            self.apply(state, force)
+
+        # entities Home Assistant doesn't know (anymore) would otherwise be due on every tick
+        received = {state.entity_id for state in states}
+        with self._lock:
+            missing = [entity_id for entity_id in self._subscribers if entity_id not in received]
+        for entity_id in missing:
+            self.back_off(entity_id)
+
+    def restore(self, states: list[dict[str, Any]]) -> None:
+        """Fills the index from raw states, e.g. from a snapshot, and marks them as stale"""
+        self.stale = True
+        for state in states:
+            self.apply(EntityState.from_json(state))
+
+    def to_json(self) -> list[dict[str, Any]]:
+        """Returns the raw states of all known entities"""
+        with self._lock:
+            states = list(self.states.values())
+        return [state.to_json() for state in states]
+
+    def refresh(self, entity_id: str, force: bool = False) -> None:
+        """Fetches the state of a single entity, e.g. to confirm a command"""
+        metrics.inc('hometray_polls_total', kind='single')
+        self.apply(EntityState.from_json(self.client.request(f'states/{entity_id}')), force)
+
+    def tick(self) -> None:
+        """Polls the entities whose interval elapsed, in one bulk request if there are several"""
+        if self.offline:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            due = [entity_id for entity_id in self._subscribers if self._next_due.get(entity_id, 0) <= now]
+
+        if len(due) >= self.bulk_threshold:
+            self.poll()
+            return
+
+        for entity_id in due:
+            # one entity that fails, e.g. because it was removed from Home Assistant, doesn't hold up the others
+            try:
+                self.refresh(entity_id)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except BaseException as e:  # pylint: disable=broad-except
+                # including the errors of homeassistant_api, which derive from BaseException
+                print(f'Could not refresh {entity_id}:', e)
+                self.back_off(entity_id)
+
+    def back_off(self, entity_id: str) -> None:
+        """Polls an entity whose state couldn't be fetched less often, like an entity that doesn't change"""
+        now = time.monotonic()
+        with self._lock:
+            interval = self.policy.next_interval(self._intervals.get(entity_id), False)
+            self._intervals[entity_id] = interval
+            self._next_due[entity_id] = now + interval
+
+    def boost(self, entity_id: str) -> None:
+        """Polls the entity quickly for a while, e.g. after it was toggled"""
+        now = time.monotonic()
+        with self._lock:
+            self._fast_until[entity_id] = now + self.policy.fast_window
+            self._next_due[entity_id] = now + self.policy.fast_interval
+
+    def apply(self, state: EntityState, force: bool = False) -> None:
+        """Stores a state in the index and notifies the subscribers if it changed"""
+        now = time.monotonic()
+        with self._lock:
+            previous = self.states.get(state.entity_id)
+            changed = previous != state
+            if previous is not None and not changed:
+                # the unchanged state is kept, so an idle poll leaves the index as it is
+                state = previous
+            else:
+                self.states[state.entity_id] = state
+            callbacks = list(self._subscribers.get(state.entity_id, []))
+
+            if changed and previous is not None:
+                self._fast_until[state.entity_id] = now + self.policy.fast_window
+            interval = self.policy.next_interval(self._intervals.get(state.entity_id), changed)
+            self._intervals[state.entity_id] = interval
+            if self._fast_until.get(state.entity_id, 0) > now:
+                interval = self.policy.fast_interval
+            self._next_due[state.entity_id] = now + interval
+
+        if not force and not changed:
+            return
+
+        for callback in callbacks:
+            callback(state)
+
+    def entity_ids(self, domain: str) -> list[str]:
+        """Returns the ids of all known entities of the given domain"""
+        prefix = f'{domain}.'
+        with self._lock:
+            return [entity_id for entity_id in self.states if entity_id.startswith(prefix)]
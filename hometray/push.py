@@ -0,0 +1,163 @@
+"""Push based state updates over the Home Assistant WebSocket API"""
+from __future__ import annotations
+
+import json
+import random
+import sys
+import threading
+from typing import Any
+
+import websocket
+
+if getattr(sys, 'frozen', False):
+    from hometray.entitystate import EntityState
+    from hometray.health import ConnectionHealth
+    from hometray.poller import StatePoller
+else:
+    from entitystate import EntityState  # type:ignore
+    from health import ConnectionHealth  # type:ignore
+    from poller import StatePoller  # type:ignore
+
+
+class AuthenticationError(Exception):
+    """Raised when Home Assistant rejects the access token"""
+
+
+def websocket_url(api_url: str) -> str:
+    """Derive the WebSocket endpoint from the REST api url, e.g. http://host:8123/api -> ws://host:8123/api/websocket"""
+    url = api_url.rstrip('/')
+    if url.startswith('https://'):
+        url = 'wss://' + url[len('https://'):]
+    elif url.startswith('http://'):
+        url = 'ws://' + url[len('http://'):]
+    return f'{url}/websocket'
+
+
+class StateStream:
+    """
+    Subscribes to state_changed events and feeds the new states into the poller.
+    When nothing was received for ping_interval seconds a ping is sent, the connection is dropped if that isn't answered either.
+    Failed connections and disconnects are recorded in the health, so an outage is noticed without polling.
+    """
+
+    def __init__(self, api_url: str, token: str, poller: StatePoller, reconnect_delay: float = 5.0, max_reconnect_delay: float = 120.0, ping_interval: float = 30.0, health: ConnectionHealth | None = None) -> None:
+        super().__init__()
+        self.url: str = websocket_url(api_url)
+        self.token: str = token
+        self.poller: StatePoller = poller
+        self.reconnect_delay: float = reconnect_delay
+        self.max_reconnect_delay: float = max(reconnect_delay, max_reconnect_delay)
+        self.ping_interval: float = ping_interval
+        self.health: ConnectionHealth = ConnectionHealth() if health is None else health
+        # doubles with every failed connection attempt, reset once connected
+        self._delay: float = reconnect_delay
+
+        self.connected: threading.Event = threading.Event()
+        self._stop: threading.Event = threading.Event()
+        self._socket: websocket.WebSocket | None = None
+        self._message_id: int = 0
+        self._thread: threading.Thread = threading.Thread(target=self._run, name='StateStream', daemon=True)
+
+    def start(self) -> None:
+        """Starts listening in a background thread"""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Closes the connection and stops the background thread"""
+        self._stop.set()
+        if self._socket is not None:
+            self._socket.close()
+        self._thread.join(timeout=self.reconnect_delay)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except AuthenticationError as e:
+                print('WebSocket authentication failed:', e)
+                return
+            except (websocket.WebSocketException, OSError, ValueError):
+                # ValueError covers a message that isn't valid JSON
+                if not self._stop.is_set():
+                    self.health.record_failure()
+            finally:
+                self.connected.clear()
+                self._socket = None
+
+            if self._stop.is_set():
+                return
+
+            self._stop.wait(self._delay * random.uniform(0.8, 1.2))
+            self._delay = min(self._delay * 2, self.max_reconnect_delay)
+
+    def _listen(self) -> None:
+        self._socket = websocket.create_connection(self.url, timeout=self.reconnect_delay)
+
+        self._receive('auth_required')
+        self._send({'type': 'auth', 'access_token': self.token})
+        self._receive('auth_ok')
+
+        self._message_id = 0
+        self._send({'id': self._next_id(), 'type': 'subscribe_events', 'event_type': 'state_changed'})
+        self._receive('result')
+        # marks Home Assistant as reachable again before the resync, which is skipped while it is offline
+        self.health.record_success()
+
+        # events may have been missed while the socket was down. Polling only once the subscription is confirmed means no change
+        # can slip in between the poll and the subscription. While Home Assistant is unreachable it is resynced on recovery.
+        if not self.poller.offline:
+            try:
+                self.poller.poll()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except BaseException as e:  # pylint: disable=broad-except
+                # including the errors of homeassistant_api, which derive from BaseException
+                print('Resync after connecting failed:', e)
+
+        self._socket.settimeout(self.ping_interval)
+        self.connected.set()
+        self._delay = self.reconnect_delay
+        pinged = False
+        while not self._stop.is_set():
+            try:
+                data = self._recv()
+            except websocket.WebSocketTimeoutException:
+                # a half-open connection, e.g. after the network changed, is only noticed when something is sent
+                if pinged:
+                    raise
+                self._send({'id': self._next_id(), 'type': 'ping'})
+                pinged = True
+                continue
+
+            pinged = False
+            message = json.loads(data)
+            if message.get('type') != 'event':
+                continue
+
+            new_state = message['event']['data'].get('new_state')
+            if new_state is not None:
+                self.poller.apply(EntityState.from_json(new_state))
+
+    def _next_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    def _recv(self) -> str | bytes:
+        assert self._socket is not None
+        data = self._socket.recv()
+        # recv returns an empty string for a close frame
+        if not data:
+            raise websocket.WebSocketConnectionClosedException('Home Assistant closed the connection')
+        return data
+
+    def _send(self, message: dict[str, Any]) -> None:
+        assert self._socket is not None
+        self._socket.send(json.dumps(message))
+
+    def _receive(self, expected_type: str) -> dict[str, Any]:
+        message: dict[str, Any] = json.loads(self._recv())
+        if message.get('type') == 'auth_invalid':
+            raise AuthenticationError(message.get('message', ''))
+        if message.get('type') != expected_type or message.get('success') is False:
+            raise websocket.WebSocketException(f'Unexpected message: {message}')
+        return message
@@ -0,0 +1,66 @@
+"""Shared Home Assistant service metadata"""
+from __future__ import annotations
+
+import sys
+import threading
+from typing import Any
+from typing import TYPE_CHECKING
+
+if getattr(sys, 'frozen', False):
+    from hometray.entitystate import EntityState
+else:
+    from entitystate import EntityState  # type:ignore
+
+if TYPE_CHECKING:
+    import homeassistant_api as ha
+
+
+class DomainRegistry:
+    """
+    Loads the services of all domains in one request and shares them between the tray icons.
+    Only the service names are kept, interned, the descriptions and fields of the services are never used.
+    They are only needed for commands, so unless they are restored from a snapshot they are loaded on first use.
+    """
+
+    def __init__(self, client: ha.Client) -> None:
+        super().__init__()
+        self.client: ha.Client = client
+        self.services: dict[str, frozenset[str]] = {}
+        self.loaded: bool = False
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Fetches the services of all domains"""
+        services = self._parse(self.client.request('services'))
+        with self._lock:
+            self.services = services
+            self.loaded = True
+
+    def has_service(self, domain_id: str, service: str) -> bool:
+        """Returns whether Home Assistant provides the service for the domain"""
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.services = self._parse(self.client.request('services'))
+                    self.loaded = True
+        return service in self.services.get(domain_id, ())
+
+    def call(self, domain_id: str, service: str, **service_data: Any) -> list[EntityState]:
+        """Calls a service and returns the states that changed while it ran"""
+        data = self.client.request(f'services/{domain_id}/{service}', method='POST', json=service_data)
+        return [EntityState.from_json(state) for state in data]
+
+    def to_json(self) -> list[dict[str, Any]]:
+        """Returns the services in the format of the /api/services endpoint, without their descriptions"""
+        return [{'domain': domain_id, 'services': dict.fromkeys(sorted(services), {})} for domain_id, services in self.services.items()]
+
+    def restore(self, services: list[dict[str, Any]]) -> None:
+        """Restores the services from the format of the /api/services endpoint, e.g. from a snapshot"""
+        with self._lock:
+            self.services = self._parse(services)
+            # a snapshot taken before the services were needed has none
+            self.loaded = bool(services)
+
+    @staticmethod
+    def _parse(domains: list[dict[str, Any]]) -> dict[str, frozenset[str]]:
+        return {sys.intern(domain['domain']): frozenset(sys.intern(service) for service in domain['services']) for domain in domains}
@@ -0,0 +1,145 @@
+"""A single shared background scheduler for all periodic work"""
+from __future__ import annotations
+
+import heapq
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+if getattr(sys, 'frozen', False):
+    from hometray.metrics import metrics
+else:
+    from metrics import metrics  # type:ignore
+
+
+class Job:
+    """A periodic job, created through Scheduler.every"""
+
+    def __init__(self, scheduler: Scheduler, interval: float, func: Callable[[], None], jitter: float) -> None:
+        super().__init__()
+        self.scheduler: Scheduler = scheduler
+        self.interval: float = interval
+        self.func: Callable[[], None] = func
+        self.jitter: float = jitter
+        self.next_run: float = 0.0
+        self.cancelled: bool = False
+
+    def __lt__(self, other: Job) -> bool:
+        return self.next_run < other.next_run
+
+    def _schedule_next(self, now: float) -> None:
+        spread = self.interval * self.jitter
+        self.next_run = now + max(0.0, self.interval + random.uniform(-spread, spread))
+
+    def cancel(self) -> None:
+        """Stops the job from being run again"""
+        self.scheduler.cancel(self)
+
+
+class Scheduler:
+    """
+    Runs periodic jobs and one-off tasks on one worker thread.
+    The next run of a job is planned after the previous one finished, so a slow
+    response delays the job instead of queueing up missed runs.
+    """
+
+    def __init__(self, jitter: float = 0.1, max_pending: int = 32) -> None:
+        super().__init__()
+        self.jitter: float = jitter
+        self._jobs: list[Job] = []
+        self._pending: deque[tuple[Callable[[], None], float]] = deque()
+        self._max_pending: int = max_pending
+        self._condition: threading.Condition = threading.Condition()
+        self._stopped: bool = False
+        self._thread: threading.Thread = threading.Thread(target=self._run, name='Scheduler', daemon=True)
+
+    def every(self, interval: float, func: Callable[[], None], jitter: float | None = None) -> Job:
+        """Runs func every interval seconds, spread by a random jitter (fraction of the interval)"""
+        job = Job(self, interval, func, self.jitter if jitter is None else jitter)
+        with self._condition:
+            # spread the first runs so jobs with the same interval don't share a tick
+            job.next_run = time.monotonic() + random.uniform(0, interval * job.jitter)
+            heapq.heappush(self._jobs, job)
+            self._condition.notify()
+        return job
+
+    def cancel(self, job: Job) -> None:
+        """Removes a job from the scheduler"""
+        with self._condition:
+            job.cancelled = True
+            if job in self._jobs:
+                self._jobs.remove(job)
+                heapq.heapify(self._jobs)
+
+    def reschedule(self, job: Job, interval: float, delay: float | None = None) -> None:
+        """Changes the interval of a job and optionally when it runs next"""
+        with self._condition:
+            job.interval = interval
+            if delay is not None and job in self._jobs:
+                job.next_run = time.monotonic() + delay
+                heapq.heapify(self._jobs)
+            self._condition.notify()
+
+    def call_soon(self, func: Callable[[], None]) -> bool:
+        """
+        Queues a one-off task for the worker thread.
+        Returns False if the task is already queued or the queue is full.
+        """
+        with self._condition:
+            if any(pending == func for pending, _ in self._pending) or len(self._pending) >= self._max_pending:
+                return False
+            self._pending.append((func, time.monotonic()))
+            self._condition.notify()
+        return True
+
+    def start(self) -> None:
+        """Starts the worker thread"""
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        """Stops the worker thread after the currently running task finished"""
+        with self._condition:
+            self._stopped = True
+            self._pending.clear()
+            self._condition.notify()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _next_task(self) -> tuple[Callable[[], None], Job | None, float] | None:
+        """Waits for the next task, returns it with the time it waited past its due time"""
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+                if self._pending:
+                    func, queued = self._pending.popleft()
+                    return func, None, now - queued
+
+                if self._jobs and self._jobs[0].next_run <= now:
+                    job = heapq.heappop(self._jobs)
+                    return job.func, job, now - job.next_run
+
+                timeout = self._jobs[0].next_run - now if self._jobs else None
+                self._condition.wait(timeout)
+        return None
+
+    def _run(self) -> None:
+        while (task := self._next_task()) is not None:
+            func, job, lag = task
+            metrics.observe('hometray_scheduler_lag_seconds', lag)
+            try:
+                func()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except BaseException as e:  # pylint: disable=broad-except
+                # the errors of homeassistant_api derive from BaseException and would end the worker thread,
+                # catching them by their base keeps the import of homeassistant_api off the startup path
+                print('Scheduled task failed:', e)
+
+            if job is not None:
+                with self._condition:
+                    if not job.cancelled:
+                        job._schedule_next(time.monotonic())
+                        heapq.heappush(self._jobs, job)
@@ -3,8 +3,6 @@ from __future__ import annotations
 
 import sys
 import wx
-import wx.adv
-import wx.svg
 
 if getattr(sys, 'frozen', False):
     from hometray.config import Config
@@ -44,12 +42,13 @@ class Settings:
         panel = wx.Panel(window)
 
         def save(event: wx.Event, window: wx.Window, api_url: wx.TextCtrl, token: wx.TextCtrl, entities: wx.TextCtrl, domains: wx.TextCtrl, domain_entities_ignore: wx.TextCtrl) -> None:
-            self.config.api_url = api_url.GetValue()
-            self.config.token = token.GetValue()
-            self.config.entities = [x for x in entities.GetValue().split(',') if x.strip() != '']
-            self.config.domains = [x for x in domains.GetValue().split(',') if x.strip() != '']
-            self.config.domain_entities_ignore = [x for x in domain_entities_ignore.GetValue().split(',') if x.strip() != '']
-            self.config.save()
+            with self.config.batch():
+                self.config.api_url = api_url.GetValue()
+                self.config.token = token.GetValue()
+                self.config.entities = [x for x in entities.GetValue().split(',') if x.strip() != '']
+                self.config.domains = [x for x in domains.GetValue().split(',') if x.strip() != '']
+                self.config.domain_entities_ignore = [x for x in domain_entities_ignore.GetValue().split(',') if x.strip() != '']
+                self.config.save()
             window.Close()
 
         def cancel(event: wx.Event, window: wx.Window) -> None:
@@ -0,0 +1,41 @@
+"""Persists the last known entity states and service metadata between launches"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+
+class Snapshot:
+    """A JSON file holding the raw states and services, used to draw the tray icons before Home Assistant responds"""
+
+    version: int = 1
+
+    def __init__(self, filename: str | Path) -> None:
+        super().__init__()
+        self.filename: Path = Path(filename)
+
+    @classmethod
+    def next_to(cls: type[Snapshot], config_filename: str | Path, name: str = 'snapshot.json') -> Snapshot:
+        """Create a snapshot that is stored in the same directory as the config file"""
+        return cls(Path(config_filename).absolute().parent / name)
+
+    def load(self) -> dict[str, Any] | None:
+        """Returns the stored states and services, or None if there is no usable snapshot"""
+        try:
+            with open(self.filename, encoding='utf8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return None
+        return data
+
+    def save(self, states: list[dict[str, Any]], services: list[dict[str, Any]]) -> None:
+        """Writes the snapshot, replacing the previous one atomically"""
+        temp_filename = self.filename.with_name(self.filename.name + '.tmp')
+        with open(temp_filename, 'w', encoding='utf8') as f:
+            json.dump({'version': self.version, 'states': states, 'services': services}, f)
+        os.replace(temp_filename, self.filename)
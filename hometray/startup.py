@@ -0,0 +1,174 @@
+"""Timing of the imports and phases until the first tray icon is shown, see --profile-startup"""
+from __future__ import annotations
+
+import importlib.abc
+import importlib.machinery
+import json
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Any
+from typing import Sequence
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps the loader of a module to measure how long creating and executing it takes"""
+
+    def __init__(self, loader: importlib.abc.Loader, profile: StartupProfile) -> None:
+        super().__init__()
+        self._loader = loader
+        self._profile = profile
+
+    def create_module(self, spec: importlib.machinery.ModuleSpec) -> ModuleType | None:
+        # extension modules, e.g. the ones of wx, do most of their work here
+        with self._profile.timing(spec.name):
+            return self._loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        with self._profile.timing(module.__name__):
+            self._loader.exec_module(module)
+
+    def __getattr__(self, name: str) -> Any:
+        # e.g. get_resource_reader or is_package of the wrapped loader
+        return getattr(self._loader, name)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Finds modules through the other finders and wraps their loaders in a _TimedLoader"""
+
+    def __init__(self, profile: StartupProfile) -> None:
+        super().__init__()
+        self._profile = profile
+        self._finding = threading.local()
+
+    def find_spec(self, fullname: str, path: Sequence[str] | None, target: ModuleType | None = None) -> importlib.machinery.ModuleSpec | None:
+        if getattr(self._finding, 'active', False):
+            return None
+        self._finding.active = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                        spec.loader = _TimedLoader(spec.loader, self._profile)
+                    return spec
+            return None
+        finally:
+            self._finding.active = False
+
+
+class _Timing:
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile: StartupProfile, name: str) -> None:
+        self.profile = profile
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+        self.profile._stack().append(0.0)
+
+    def __exit__(self, *_: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        stack = self.profile._stack()
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.profile._record(self.name, elapsed, elapsed - nested)
+
+
+class StartupProfile:
+    """
+    Records how long every import and every startup phase took, relative to when the entry point started.
+    Disabled unless enabled by --profile-startup; the report is printed once the first icon is shown.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.enabled: bool = False
+        self.start: float = time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+        # module name -> (cumulative seconds, seconds without its own imports)
+        self.imports: dict[str, tuple[float, float]] = {}
+        self.output: str | None = None
+
+        self._finder: _ImportTimer | None = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._finished: bool = False
+
+    def enable(self, output: str | None = None) -> None:
+        """Starts timing the imports, the report is also written as JSON to output if given"""
+        self.enabled = True
+        self.output = output
+        self._finder = _ImportTimer(self)
+        sys.meta_path.insert(0, self._finder)
+
+    def mark(self, phase: str) -> None:
+        """Records that a startup phase finished"""
+        if self.enabled and not self._finished:
+            with self._lock:
+                self.phases.append((phase, time.perf_counter() - self.start))
+
+    def finish(self, phase: str) -> None:
+        """Records the last phase, e.g. the first icon being shown, and reports everything once"""
+        if not self.enabled or self._finished:
+            return
+        self.mark(phase)
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        if self._finder is not None and self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+        print(self.report(), file=sys.stderr)
+        if self.output:
+            try:
+                with open(self.output, 'w', encoding='utf8') as file:
+                    json.dump(self.to_json(), file, indent=2)
+            except OSError as e:
+                print('Could not write the startup profile:', e, file=sys.stderr)
+
+    def timing(self, name: str) -> _Timing:
+        return _Timing(self, name)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            'phases': {phase: round(seconds * 1000, 1) for phase, seconds in self.phases},
+            'imports': {name: {'cumulative_ms': round(cumulative * 1000, 1), 'self_ms': round(own * 1000, 1)} for name, (cumulative, own) in self._slowest_imports(len(self.imports))},
+        }
+
+    def report(self, top: int = 15) -> str:
+        """The phases and the slowest imports as a table"""
+        lines = ['Startup profile (ms since the entry point started)']
+        for phase, seconds in self.phases:
+            lines.append(f'  {phase:<40} {seconds * 1000:>8.1f}')
+        lines.append(f'Slowest of {len(self.imports)} imports (cumulative / self ms)')
+        for name, (cumulative, own) in self._slowest_imports(top):
+            lines.append(f'  {name:<40} {cumulative * 1000:>8.1f} {own * 1000:>8.1f}')
+        return '\n'.join(lines)
+
+    def _slowest_imports(self, count: int) -> list[tuple[str, tuple[float, float]]]:
+        with self._lock:
+            imports = list(self.imports.items())
+        return sorted(imports, key=lambda item: item[1][0], reverse=True)[:count]
+
+    def _stack(self) -> list[float]:
+        stack: list[float] | None = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, name: str, cumulative: float, own: float) -> None:
+        with self._lock:
+            previous = self.imports.get(name, (0.0, 0.0))
+            # creating and executing a module are timed separately
+            self.imports[name] = (previous[0] + cumulative, previous[1] + own)
+
+
+profile = StartupProfile()
@@ -0,0 +1,23 @@
+"""Recolourable SVG icon templates"""
+from __future__ import annotations
+
+import hashlib
+import re
+
+_FILL = re.compile(r'fill="#[0-9a-f]{3,6}"')
+
+
+class SvgTemplate:
+    """An SVG file split at its fill colours once, so recolouring it is a single join"""
+
+    __slots__ = ('parts', 'content_hash')
+
+    def __init__(self, icon_data: bytes) -> None:
+        super().__init__()
+        self.content_hash: str = hashlib.sha1(icon_data).hexdigest()[:16]
+        self.parts: list[str] = _FILL.split(icon_data.decode('utf8'))
+
+    def render(self, color: list[int]) -> bytes:
+        """Returns the SVG with every fill replaced by the given colour"""
+        r, g, b = color
+        return f'fill="#{r:02x}{g:02x}{b:02x}"'.join(self.parts).encode()
@@ -0,0 +1,106 @@
+"""HTTP transport shared by all requests to Home Assistant"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class _InFlight:
+    """A GET request other threads can wait for instead of sending the same request"""
+
+    __slots__ = ('done', 'response', 'error')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.response: requests.Response | None = None
+        self.error: BaseException | None = None
+
+
+class PooledSession(requests.Session):
+    """
+    A requests session tuned for many small requests to one server:
+    - a sized keep-alive connection pool, shared by the poller, the command executor and the bulk calls
+    - compressed responses and a default timeout
+    - identical GET requests that are in flight at the same time, or were answered less than
+      dedup_window seconds ago, share one response; any other request ends that reuse, so the
+      state fetched to confirm a command is never older than the command
+    - conditional requests for responses that carry an ETag
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float | tuple[float, float] = (3.05, 10), dedup_window: float = 0.05) -> None:
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.timeout: float | tuple[float, float] = timeout
+        self.dedup_window: float = dedup_window
+
+        self._lock = threading.Lock()
+        self._in_flight: dict[tuple[str, str], _InFlight] = {}
+        self._recent: dict[tuple[str, str], tuple[float, requests.Response]] = {}
+        self._etags: dict[tuple[str, str], tuple[str, requests.Response]] = {}
+        # increased by every request that may change something, responses of GETs started before aren't shared
+        self._generation: int = 0
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        if method.upper() != 'GET' or args or kwargs.get('data') or kwargs.get('json'):
+            with self._lock:
+                self._generation += 1
+                self._recent.clear()
+                self._in_flight.clear()
+            return super().request(method, url, *args, **kwargs)
+
+        key = (url, repr(sorted((kwargs.get('params') or {}).items())))
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is not None and time.monotonic() - recent[0] < self.dedup_window:
+                return recent[1]
+            in_flight = self._in_flight.get(key)
+            leader = in_flight is None
+            if in_flight is None:
+                in_flight = self._in_flight[key] = _InFlight()
+            generation = self._generation
+
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            assert in_flight.response is not None
+            return in_flight.response
+
+        try:
+            in_flight.response = self._get(key, url, **kwargs)
+            return in_flight.response
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is in_flight:
+                    del self._in_flight[key]
+                if in_flight.response is not None and in_flight.response.ok and generation == self._generation:
+                    self._recent[key] = (time.monotonic(), in_flight.response)
+            in_flight.done.set()
+
+    def _get(self, key: tuple[str, str], url: str, **kwargs: Any) -> requests.Response:
+        cached = self._etags.get(key)
+        if cached is not None:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), 'If-None-Match': cached[0]}
+
+        response = super().request('GET', url, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            return cached[1]
+
+        # read the body now, so the threads sharing the response don't race to read it
+        _ = response.content
+        etag = response.headers.get('ETag')
+        if etag is not None and response.ok:
+            with self._lock:
+                self._etags[key] = (etag, response)
+        return response
@@ -1,82 +1,182 @@
 """Defines elements for the system tray"""
 from __future__ import annotations
 
+import functools
 import sys
 import threading
-import time
 from typing import Callable
 from typing import Any
 
-import homeassistant_api as ha
-import schedule
 import wx
 import wx.adv
 
 if getattr(sys, 'frozen', False):
+    from hometray.bitmapcache import quantize_color
+    from hometray.bulk import call_service_bulk
+    from hometray.commands import CommandExecutor
+    from hometray.display import entity_display
+    from hometray.entitystate import EntityState
+    from hometray.display import group_display
     from hometray.iconmanager import IconManager
+    from hometray.metrics import metrics
     from hometray.config import Config
+    from hometray.groups import GroupSummary
+    from hometray.poller import StatePoller
+    from hometray.registry import DomainRegistry
     from hometray.settings import Settings
+    from hometray.startup import profile
 else:
+    from bitmapcache import quantize_color  # type:ignore
+    from bulk import call_service_bulk  # type:ignore
+    from commands import CommandExecutor  # type:ignore
+    from display import entity_display  # type:ignore
+    from entitystate import EntityState  # type:ignore
+    from display import group_display  # type:ignore
     from iconmanager import IconManager  # type:ignore
+    from metrics import metrics  # type:ignore
     from config import Config  # type:ignore
+    from groups import GroupSummary  # type:ignore
+    from poller import StatePoller  # type:ignore
+    from registry import DomainRegistry  # type:ignore
     from settings import Settings  # type:ignore
+    from startup import profile  # type:ignore
 
 
-class EntityTrayIcon(wx.adv.TaskBarIcon):
-    """Defines a system tray icon for a Home Assistant entity"""
+class TrayIcon(wx.adv.TaskBarIcon):
+    """Base class of the tray icons, draws the icon and talks to Home Assistant"""
 
-    def __init__(self, frame: wx.Frame, entity_id: str, client: ha.Client, icons: IconManager, config: Config, settings: Settings) -> None:
+    def __init__(self, frame: wx.Frame, domains: DomainRegistry, poller: StatePoller, commands: CommandExecutor, icons: IconManager, config: Config, settings: Settings) -> None:
         super().__init__()
         self.frame: wx.Frame = frame
-        self.entity_id: str = entity_id
-        self.domain_id: str = entity_id.split('.')[0]
-        self.client: ha.Client = client
+        self.domains: DomainRegistry = domains
+        self.poller: StatePoller = poller
+        self.commands: CommandExecutor = commands
         self.icons: IconManager = icons
         self.config: Config = config
         self.settings: Settings = settings
 
-        self.has_color_control = False
-
-        schedule.every(self.config.update_interval).seconds.do(self.update_state)
-        self.stop_updater: threading.Event = run_continuously()
+        # what the native icon currently shows and the newest update waiting for the UI thread
+        self._displayed: tuple[str, str, tuple[int, ...], str | None] | None = None
+        self._pending: tuple[str, str, tuple[int, ...], str | None] | None = None
+        self._flush_posted: bool = False
+        self._removed: bool = False
+        self._display_lock = threading.Lock()
 
         self.Bind(wx.adv.EVT_TASKBAR_LEFT_DOWN, self.on_left_down)
         self.Bind(wx.adv.EVT_TASKBAR_RIGHT_UP, self.on_right_up)
 
-        self.domain: ha.Domain = self.client.get_domain('homeassistant')
-        self.specific_domain: ha.Domain = self.client.get_domain(self.domain_id)
+    def set_icon(self, icon_name: str, icon_state: str, icon_color: list[int], tooltip: str | None) -> None:
+        """
+        Sets the icon and tooltip for the tray icon, can be called from any thread.
+        The update is applied on the UI thread; updates arriving before that are coalesced
+        and nothing is done if the icon already shows the same.
+        """
+        with self._display_lock:
+            self._pending = (icon_name, icon_state, tuple(icon_color), tooltip)
+            if self._flush_posted:
+                return
+            self._flush_posted = True
+        wx.CallAfter(self._flush_icon)
+
+    def _flush_icon(self) -> None:
+        with self._display_lock:
+            pending, self._pending = self._pending, None
+            self._flush_posted = False
+        if pending is None or self._removed:
+            return
+
+        # compared by the colour the icon is drawn with, so changing the quantization draws the icon again
+        icon_name, icon_state, icon_color, tooltip = pending
+        drawn = (icon_name, icon_state, tuple(quantize_color(list(icon_color), self.icons.color_quantization)), tooltip)
+        if drawn == self._displayed:
+            return
+
+        icon = self.icons.get_icon(icon_name, icon_state, list(icon_color))
+        self.SetIcon(icon, tooltip)
+        self._displayed = drawn
+        profile.finish('first icon')
+
+    def call_service(self, domain_id: str, service: str, entity_id: str, **service_data: Any) -> None:
+        """Calls a service for an entity and reconciles the icon with the resulting state, runs on the command executor"""
+        changed_states = self.domains.call(domain_id, service, entity_id=entity_id, **service_data)
+        self.poller.boost(entity_id)
+
+        confirmed = False
+        for state in changed_states:
+            self.poller.apply(state, force=state.entity_id == entity_id)
+            confirmed = confirmed or state.entity_id == entity_id
+        if not confirmed:
+            self.poller.refresh(entity_id, force=True)
+
+    def bulk_action(self, service: str, entity_ids: list[str]) -> None:
+        """Calls a service for many entities in one batched request, see call_service_bulk"""
+        if entity_ids:
+            self.commands.submit(lambda: call_service_bulk(self.domains, self.poller, service, entity_ids), on_error=lambda _: wx.CallAfter(self.rollback))
+
+    def redraw(self) -> None:
+        """Draws the icon for the last known state again"""
+
+    def rollback(self) -> None:
+        """Shows the last known real state again after a failed command"""
+        self.redraw()
+
+    def add_app_menu_items(self, menu: wx.Menu) -> None:
+        """Appends the entries every tray icon menu ends with"""
+        menu.AppendSeparator()
+        add_menu_item(menu, 'Configure HomeTray', lambda _: self.settings.configure())
+        add_menu_item(menu, 'Diagnostics', lambda _: wx.MessageBox(metrics.summary(), 'HomeTray Diagnostics'))
+        add_menu_item(menu, 'Close HomeTray', self.on_exit_clicked)
 
-        # print("Domain Services")
-        # for service_id in self.specific_domain.services:
-        #     service: ha.Service = self.specific_domain.services[service_id]
-        #     service_name = service.name
-        #     service_description = service.description
-        #     service_fields = service.fields
-        #     print(service_name, list(service_fields.keys()))
+    def on_left_down(self, _: Any) -> None:
+        pass
 
-        self.update_state()
+    def on_right_up(self, _: Any) -> None:
+        pass
 
-    def update_state(self) -> None:
-        """Gets the current state of the entity and updates the icon"""
+    def cleanup(self) -> None:
+        """Cleans up the tray icon"""
+        self._removed = True
+        self.RemoveIcon()
+        wx.CallAfter(self.Destroy)
 
-        entity = self.client.get_entity(entity_id=self.entity_id)
-        entity_state = entity.state.state
-        entity_icon = entity.state.attributes['icon'] if 'icon' in entity.state.attributes else 'default'
-        entity_name = entity.state.attributes['friendly_name'] if 'friendly_name' in entity.state.attributes else self.entity_id
+    def on_exit_clicked(self, _: Any) -> None:
+        """Closes the application"""
+        wx.Exit()
 
-        if entity_state == 'on':
-            if self.config.color_use_rgb_value and 'rgb_color' in entity.state.attributes:
-                self.rgb_color = entity.state.attributes['rgb_color']
-                self.has_color_control = True
 
-            else:
-                self.rgb_color = self.config.color_on
-        elif entity_state == 'off':
-            self.rgb_color = self.config.color_off
-        else:
-            self.rgb_color = self.config.color_unknown
+class EntityTrayIcon(TrayIcon):
+    """Defines a system tray icon for a Home Assistant entity"""
 
-        self.set_icon(entity_icon, entity_state, self.rgb_color, entity_name)
+    def __init__(self, frame: wx.Frame, entity_id: str, domains: DomainRegistry, poller: StatePoller, commands: CommandExecutor, icons: IconManager, config: Config, settings: Settings, select_entities: Callable[[], list[str]]) -> None:
+        super().__init__(frame, domains, poller, commands, icons, config, settings)
+        self.entity_id: str = entity_id
+        self.domain_id: str = entity_id.split('.')[0]
+        # returns the entities shown as tray icons, see Engine.select_entities
+        self.select_entities: Callable[[], list[str]] = select_entities
+
+        self.has_color_control = False
+
+        self.poller.subscribe(self.entity_id, self.on_state)
+
+    def update_state(self) -> None:
+        """Fetches the current state of the entity, the icon is updated through the poller"""
+        self.poller.refresh(self.entity_id, force=True)
+
+    def on_state(self, state: EntityState) -> None:
+        """Updates the icon from the given entity state"""
+        with metrics.timer('hometray_update_state_seconds'):
+            self._on_state(state)
+
+    def _on_state(self, state: EntityState) -> None:
+        display = entity_display(state, self.config, self.poller.stale, self.poller.offline)
+        if display.state == 'on' and self.config.color_use_rgb_value and state.rgb_color is not None:
+            self.has_color_control = True
+        self.rgb_color = display.color
+        self.set_icon(*display)
+
+    def domain_entity_ids(self) -> list[str]:
+        """The selected entities of the same domain, not the ones that are ignored in the config"""
+        return [entity_id for entity_id in self.select_entities() if entity_id.split('.')[0] == self.domain_id]
 
     def pick_color(self) -> None:
         """Opens a color picker dialog"""
@@ -90,25 +190,28 @@ class EntityTrayIcon(wx.adv.TaskBarIcon):
 
         def set_color(color: wx.Colour) -> None:
             rgb = [color.Red(), color.Green(), color.Blue()]
-            self.specific_domain.turn_on(entity_id=self.entity_id, rgb_color=rgb)
             self.rgb_color = rgb
+            # dragging across the colour wheel fires many events, only the newest colour is sent at a limited rate
+            self.commands.submit_latest((self.entity_id, 'turn_on', 'rgb_color'), lambda: self.call_service(self.domain_id, 'turn_on', self.entity_id, rgb_color=rgb), on_error=lambda _: wx.CallAfter(self.rollback))
 
         dialog.Bind(wx.EVT_COLOUR_CHANGED, lambda e: set_color(e.Colour))
         dialog.CenterOnScreen()
         dialog.ShowModal()
         dialog.Destroy()
 
-    def set_icon(self, icon_name: str, icon_state: str, icon_color: list[int], tooltip: str | None) -> None:
-        """Sets the icon and tooltip for the tray icon"""
-        icon = self.icons.get_icon(icon_name, icon_state, icon_color)
-        self.SetIcon(icon, tooltip)
+    def redraw(self) -> None:
+        """Draws the icon for the last known state again, e.g. after the colours were changed"""
+        state = self.poller.states.get(self.entity_id)
+        if state is not None:
+            self.on_state(state)
 
     def on_left_down(self, _: Any) -> None:
-        """Toggles the entity when the icon is clicked"""
-        self.update_state()
-        self.domain.toggle(entity_id=self.entity_id)
-        time.sleep(0.1)
-        self.update_state()
+        """Toggles the entity when the icon is clicked, showing the expected state right away"""
+        state = self.poller.states.get(self.entity_id)
+        if state is not None and state.state in ('on', 'off'):
+            self.on_state(state.replace(state='off' if state.state == 'on' else 'on'))
+
+        self.commands.submit(lambda: self.call_service('homeassistant', 'toggle', self.entity_id), on_error=lambda _: wx.CallAfter(self.rollback))
 
     def on_right_up(self, _: Any) -> None:
         """Displays the right-click menu"""
@@ -116,48 +219,118 @@ class EntityTrayIcon(wx.adv.TaskBarIcon):
         add_menu_item(menu, 'Toggle', self.on_left_down, bold=True)
         if self.has_color_control:
             add_menu_item(menu, 'Change Color', lambda _: self.pick_color())
-        menu.AppendSeparator()
-        add_menu_item(menu, 'Configure HomeTray', lambda _: self.settings.configure())
-        add_menu_item(menu, 'Close HomeTray', self.on_exit_clicked)
+        add_menu_item(menu, f'All {self.domain_id} entities off', lambda _: self.bulk_action('turn_off', self.domain_entity_ids()))
+        self.add_app_menu_items(menu)
         add_menu_item(menu, 'Change Color', lambda _: self.pick_color())
         self.PopupMenu(menu)
         menu.Destroy()
 
     def cleanup(self) -> None:
         """Cleans up the tray icon"""
-        self.stop_updater.set()
-        self.RemoveIcon()
-        self.frame.Close()
-        wx.CallAfter(self.Destroy)
-
-    def on_exit_clicked(self, _: Any) -> None:
-        """Closes the application"""
-        wx.Exit()
+        self.poller.unsubscribe(self.entity_id, self.on_state)
+        super().cleanup()
 
 
-def run_continuously(interval: int = 1) -> threading.Event:
+class GroupTrayIcon(TrayIcon):
     """
-    Continuously run, while executing pending jobs at each
-    elapsed time interval.
-    https://schedule.readthedocs.io/en/stable/background-execution.html
+    One tray icon for a group of entities, showing how many of them are on.
+    The members are listed in its menu, so a large domain doesn't flood the tray.
     """
 
-    cease_continuous_run: threading.Event = threading.Event()
+    def __init__(self, frame: wx.Frame, name: str, entity_ids: list[str], domains: DomainRegistry, poller: StatePoller, commands: CommandExecutor, icons: IconManager, config: Config, settings: Settings) -> None:
+        super().__init__(frame, domains, poller, commands, icons, config, settings)
+        self.name: str = name
+        self.entity_ids: list[str] = []
+        self.summary: GroupSummary = GroupSummary()
+        self._summary_lock = threading.Lock()
+        # whether the icon was drawn from snapshot states, so it is redrawn once they are confirmed
+        self._drawn_stale: bool = False
+        self.set_members(entity_ids)
+
+    def set_members(self, entity_ids: list[str]) -> None:
+        """Changes the members of the group, only (un)subscribing the ones that were added or removed"""
+        removed = [entity_id for entity_id in self.entity_ids if entity_id not in entity_ids]
+        added = [entity_id for entity_id in entity_ids if entity_id not in self.entity_ids]
+        self.entity_ids = list(entity_ids)
+
+        for entity_id in removed:
+            self.poller.unsubscribe(entity_id, self.on_state)
+            with self._summary_lock:
+                self.summary.remove(entity_id)
+        for entity_id in added:
+            self.poller.subscribe(entity_id, self.on_state)
+        if removed or not self.entity_ids:
+            self.redraw()
+
+    def on_state(self, state: EntityState) -> None:
+        """Updates the summary from the changed member, the icon is only redrawn if the summary changed"""
+        with self._summary_lock:
+            changed = self.summary.update(state.entity_id, state.state)
+        if changed or self.poller.stale != self._drawn_stale:
+            self.redraw()
+
+    def redraw(self) -> None:
+        """Draws the icon for the current summary"""
+        self._drawn_stale = self.poller.stale
+        with self._summary_lock:
+            display = group_display(self.name, self.summary, self.icon_name(), self.config, self._drawn_stale, self.poller.offline)
+        self.set_icon(*display)
+
+    def icon_name(self) -> str:
+        """The icon of the first member that has one"""
+        for entity_id in self.entity_ids:
+            state = self.poller.states.get(entity_id)
+            if state is not None and state.icon is not None:
+                return state.icon
+        return 'default'
+
+    def toggle_member(self, entity_id: str) -> None:
+        self.commands.submit(lambda: self.call_service('homeassistant', 'toggle', entity_id), on_error=lambda _: wx.CallAfter(self.rollback))
+
+    def on_member_clicked(self, entity_id: str, _: Any) -> None:
+        self.toggle_member(entity_id)
+
+    def toggle_group(self) -> None:
+        """Turns all members off if any of them is on, otherwise turns all of them on"""
+        with self._summary_lock:
+            service = 'turn_off' if self.summary.on else 'turn_on'
+        self.bulk_action(service, self.entity_ids)
 
-    class ScheduleThread(threading.Thread):
-        @classmethod
-        def run(cls: type[ScheduleThread]) -> None:
-            while not cease_continuous_run.is_set():
-                schedule.run_pending()
-                time.sleep(interval)
+    def on_left_down(self, _: Any) -> None:
+        """Shows the members, like the right-click menu"""
+        self.on_right_up(_)
 
-    continuous_thread: ScheduleThread = ScheduleThread()
-    continuous_thread.start()
-    return cease_continuous_run
+    def on_right_up(self, _: Any) -> None:
+        """Displays the summary and a submenu with one entry per member"""
+        menu = wx.Menu()
+        with self._summary_lock:
+            header = add_menu_item(menu, f'{self.name}: {self.summary.describe()}', lambda _: None, bold=True)
+        header.Enable(False)
+
+        members = wx.Menu()
+        for entity_id in self.entity_ids:
+            state = self.poller.states.get(entity_id)
+            name = state.name if state is not None else entity_id
+            add_menu_item(members, name, functools.partial(self.on_member_clicked, entity_id), checked=state is not None and state.state == 'on')
+        menu.AppendSubMenu(members, f'Entities ({len(self.entity_ids)})')
+        menu.AppendSeparator()
+        add_menu_item(menu, 'Toggle group', lambda _: self.toggle_group(), bold=True)
+        add_menu_item(menu, 'All on', lambda _: self.bulk_action('turn_on', self.entity_ids))
+        add_menu_item(menu, 'All off', lambda _: self.bulk_action('turn_off', self.entity_ids))
+
+        self.add_app_menu_items(menu)
+        self.PopupMenu(menu)
+        menu.Destroy()
+
+    def cleanup(self) -> None:
+        """Cleans up the tray icon"""
+        for entity_id in self.entity_ids:
+            self.poller.unsubscribe(entity_id, self.on_state)
+        super().cleanup()
 
 
-def add_menu_item(menu: wx.Menu, label: str, func: Callable[[Any], None], bold: bool = False, position: int = -1) -> wx.MenuItem:
-    item = wx.MenuItem(menu, -1, label)
+def add_menu_item(menu: wx.Menu, label: str, func: Callable[[Any], None], bold: bool = False, position: int = -1, checked: bool | None = None) -> wx.MenuItem:
+    item = wx.MenuItem(menu, -1, label, kind=wx.ITEM_NORMAL if checked is None else wx.ITEM_CHECK)
     menu.Bind(wx.EVT_MENU, func, id=item.GetId())
     if bold:
         font: wx.Font = item.GetFont()
@@ -167,4 +340,6 @@ def add_menu_item(menu: wx.Menu, label: str, func: Callable[[Any], None], bold:
         menu.Insert(position, item)
     else:
         menu.Append(item)
+    if checked is not None:
+        item.Check(checked)
     return item
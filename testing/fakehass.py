@@ -0,0 +1,293 @@
+"""A small in-process stand-in for the Home Assistant REST and WebSocket APIs"""
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Any
+
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# the services the fake understands, offered for every domain that has entities
+_SERVICES = {
+    'turn_on': {'name': 'Turn on', 'description': 'Turns the entity on.', 'fields': {}},
+    'turn_off': {'name': 'Turn off', 'description': 'Turns the entity off.', 'fields': {}},
+    'toggle': {'name': 'Toggle', 'description': 'Toggles the entity.', 'fields': {}},
+}
+
+
+class FakeHass:
+    """Serves entity states over HTTP and pushes state_changed events to WebSocket subscribers"""
+
+    def __init__(self, token: str = 'test-token', latency: float = 0.0) -> None:
+        self.token = token
+        # seconds every REST response is delayed by, to resemble a real network and instance
+        self.latency = latency
+        # sends an ETag with every response and answers If-None-Match with 304, which Home Assistant itself doesn't do
+        self.etags = False
+        self.connections = 0
+        # turned off to resemble a half-open WebSocket connection, which silently drops everything
+        self.answer_pings = True
+        self.states: dict[str, dict[str, Any]] = {}
+        self.requests: list[tuple[str, str]] = []
+        self._connections: list[_Handler] = []
+        self._http_connections: set[_Handler] = set()
+        self._lock = threading.Lock()
+
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.fake = self  # type: ignore[attr-defined]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def api_url(self) -> str:
+        port = self._server.server_address[1]
+        return f'http://127.0.0.1:{port}/api'
+
+    def start(self) -> FakeHass:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.drop_connections()
+        self._server.shutdown()
+        self._server.server_close()
+        # kept alive connections would otherwise still be served after the server stopped
+        with self._lock:
+            connections = list(self._http_connections)
+        for connection in connections:
+            connection.close()
+
+    def add_entity(self, entity_id: str, state: str, **attributes: Any) -> None:
+        self.states[entity_id] = {'entity_id': entity_id, 'state': state, 'attributes': attributes}
+
+    def set_state(self, entity_id: str, state: str, **attributes: Any) -> None:
+        """Changes the state of an entity and notifies all subscribed WebSocket clients"""
+        old_state = self.states.get(entity_id)
+        self.add_entity(entity_id, state, **attributes)
+        event = {'event_type': 'state_changed', 'data': {'entity_id': entity_id, 'old_state': old_state, 'new_state': self.states[entity_id]}}
+
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            if connection.subscription is not None:
+                connection.send_json({'id': connection.subscription, 'type': 'event', 'event': event})
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(1 for connection in self._connections if connection.subscription is not None)
+
+    def drop_connections(self) -> None:
+        """Closes all open WebSocket connections, like a restart of Home Assistant would"""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
+    def close_connections(self) -> None:
+        """Sends a close frame to all WebSocket clients, like a clean shutdown of Home Assistant would"""
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.send_close()
+
+    def _register(self, connection: _Handler) -> None:
+        with self._lock:
+            self._connections.append(connection)
+
+    def _unregister(self, connection: _Handler) -> None:
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+
+    def _handle_rest(self, method: str, path: str, body: Any) -> tuple[int, Any]:
+        self.requests.append((method, path))
+        if self.latency:
+            time.sleep(self.latency)
+        parts = path.strip('/').split('/')[1:]
+
+        if method == 'GET' and parts == ['states']:
+            return 200, list(self.states.values())
+        if method == 'GET' and len(parts) == 2 and parts[0] == 'states':
+            if parts[1] not in self.states:
+                return 404, {'message': 'Entity not found.'}
+            return 200, self.states[parts[1]]
+        if method == 'GET' and parts == ['services']:
+            domains = sorted({entity_id.split('.')[0] for entity_id in self.states} | {'homeassistant'})
+            return 200, [{'domain': domain, 'services': _SERVICES} for domain in domains]
+        if method == 'POST' and len(parts) == 3 and parts[0] == 'services':
+            return self._call_service(parts[1], parts[2], body or {})
+        if method == 'GET' and parts == ['']:
+            return 200, {'message': 'API running.'}
+        return 404, {'message': 'Not found.'}
+
+    def _call_service(self, domain: str, service: str, data: dict[str, Any]) -> tuple[int, Any]:
+        """Switches the targeted entities and returns their new states, like Home Assistant does"""
+        if service not in _SERVICES:
+            return 400, {'message': f'Service {domain}.{service} not found.'}
+
+        entity_ids = data.pop('entity_id', [])
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+
+        changed = []
+        for entity_id in entity_ids:
+            current = self.states.get(entity_id)
+            if current is None or (domain != 'homeassistant' and not entity_id.startswith(f'{domain}.')):
+                continue
+            if service == 'toggle':
+                state = 'off' if current['state'] == 'on' else 'on'
+            else:
+                state = 'on' if service == 'turn_on' else 'off'
+            self.set_state(entity_id, state, **{**current['attributes'], **data})
+            changed.append(self.states[entity_id])
+        return 200, changed
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    # benchmarks open many connections at once, the default backlog of 5 would refuse some of them
+    request_queue_size = 128
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: socketserver.ThreadingTCPServer
+    subscription: int | None = None
+
+    @property
+    def fake(self) -> FakeHass:
+        return self.server.fake  # type: ignore[attr-defined]
+
+    def handle(self) -> None:
+        with self.fake._lock:
+            self.fake.connections += 1
+            self.fake._http_connections.add(self)
+        # HTTP/1.1 keeps the connection open for further requests until the client closes it
+        try:
+            while self._handle_request():
+                pass
+        finally:
+            with self.fake._lock:
+                self.fake._http_connections.discard(self)
+
+    def _handle_request(self) -> bool:
+        try:
+            request_line = self.rfile.readline().decode('latin1').strip()
+        except OSError:
+            return False
+        if not request_line:
+            return False
+        method, path, _ = request_line.split(' ', 2)
+        headers = {}
+        while (line := self.rfile.readline().decode('latin1').strip()) != '':
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get('upgrade', '').lower() == 'websocket':
+            self._handle_websocket(headers)
+            return False
+
+        body = None
+        if int(headers.get('content-length', 0)):
+            body = json.loads(self.rfile.read(int(headers['content-length'])))
+        if headers.get('authorization') != f'Bearer {self.fake.token}':
+            status, payload = 401, {'message': 'Unauthorized'}
+        else:
+            status, payload = self.fake._handle_rest(method, path, body)
+
+        data = json.dumps(payload).encode()
+        extra_headers = ''
+        if self.fake.etags:
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            extra_headers += f'ETag: {etag}\r\n'
+            if headers.get('if-none-match') == etag:
+                status, data = 304, b''
+        if data and 'gzip' in headers.get('accept-encoding', ''):
+            data = gzip.compress(data, compresslevel=5)
+            extra_headers += 'Content-Encoding: gzip\r\n'
+
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        self.wfile.write(
+            f'HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n{extra_headers}'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + data,
+        )
+        return keep_alive
+
+    def _handle_websocket(self, headers: dict[str, str]) -> None:
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + _WS_GUID).encode()).digest()).decode()
+        self.wfile.write(f'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n'.encode())
+        self._send_lock = threading.Lock()
+
+        self.send_json({'type': 'auth_required'})
+        auth = self.recv_json()
+        if auth is None or auth.get('access_token') != self.fake.token:
+            self.send_json({'type': 'auth_invalid', 'message': 'Invalid access token'})
+            return
+        self.send_json({'type': 'auth_ok'})
+        self.fake._register(self)
+
+        try:
+            while (message := self.recv_json()) is not None:
+                if message.get('type') == 'subscribe_events':
+                    self.send_json({'id': message['id'], 'type': 'result', 'success': True, 'result': None})
+                    self.subscription = message['id']
+                elif message.get('type') == 'ping' and self.fake.answer_pings:
+                    self.send_json({'id': message['id'], 'type': 'pong'})
+        finally:
+            self.fake._unregister(self)
+
+    def send_json(self, payload: Any) -> None:
+        data = json.dumps(payload).encode()
+        if len(data) < 126:
+            header = struct.pack('!BB', 0x81, len(data))
+        elif len(data) < 1 << 16:
+            header = struct.pack('!BBH', 0x81, 126, len(data))
+        else:
+            header = struct.pack('!BBQ', 0x81, 127, len(data))
+        try:
+            with self._send_lock:
+                self.wfile.write(header + data)
+        except OSError:
+            pass
+
+    def send_close(self) -> None:
+        try:
+            with self._send_lock:
+                # status 1000, a normal closure
+                self.wfile.write(struct.pack('!BBH', 0x88, 2, 1000))
+        except OSError:
+            pass
+
+    def recv_json(self) -> Any:
+        try:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return None
+            opcode, length = header[0] & 0x0f, header[1] & 0x7f
+            if length == 126:
+                length, = struct.unpack('!H', self.rfile.read(2))
+            elif length == 127:
+                length, = struct.unpack('!Q', self.rfile.read(8))
+            mask = self.rfile.read(4) if header[1] & 0x80 else b'\0\0\0\0'
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self.rfile.read(length)))
+        except OSError:
+            return None
+
+        if opcode == 0x8:
+            return None
+        if opcode != 0x1:
+            return self.recv_json()
+        return json.loads(payload)
+
+    def close(self) -> None:
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from hometray.bitmapcache import BitmapCache
+from hometray.bitmapcache import quantize_color
+
+
+def test_evicts_least_recently_used() -> None:
+    cache: BitmapCache[str] = BitmapCache(budget=30)
+    cache.put('a', 'A', 10)
+    cache.put('b', 'B', 10)
+    cache.put('c', 'C', 10)
+    assert cache.get('a') == 'A'
+
+    cache.put('d', 'D', 10)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.size == 30
+    assert len(cache) == 3
+    assert (cache.hits, cache.misses, cache.evictions) == (2, 1, 1)
+
+
+def test_replacing_entry_updates_size() -> None:
+    cache: BitmapCache[str] = BitmapCache(budget=100)
+    cache.put('a', 'A', 10)
+    cache.put('a', 'A2', 20)
+    assert cache.size == 20
+    assert cache.get('a') == 'A2'
+
+
+def test_quantize_color() -> None:
+    assert quantize_color([255, 128, 3], 0) == [255, 128, 3]
+    assert quantize_color([255, 128, 3], 16) == [255, 128, 0]
+    assert quantize_color([250, 130, 10], 16) == quantize_color([254, 127, 12], 16)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Any
+
+import homeassistant_api as ha
+import pytest
+
+from hometray.bulk import call_service_bulk
+from hometray.bulk import plan_batches
+from hometray.hassclient import HassClient
+from hometray.poller import StatePoller
+from hometray.registry import DomainRegistry
+from testing.fakehass import FakeHass
+
+ENTITIES = ['light.desk', 'light.bed', 'light.hall', 'switch.fan']
+
+
+@pytest.fixture(name='fake')
+def fake_fixture() -> Iterator[FakeHass]:
+    fake = FakeHass().start()
+    for entity_id in ENTITIES:
+        fake.add_entity(entity_id, 'on')
+    yield fake
+    fake.stop()
+
+
+def test_one_request_for_all_entities(fake: FakeHass) -> None:
+    client = HassClient(fake.api_url, fake.token)
+    poller = StatePoller(client)
+    poller.poll()
+    domains = DomainRegistry(client)
+    domains.load()
+    fake.requests.clear()
+
+    call_service_bulk(domains, poller, 'turn_off', ENTITIES)
+
+    assert fake.requests == [('POST', '/api/services/homeassistant/turn_off')]
+    assert {entity_id: poller.states[entity_id].state for entity_id in ENTITIES} == dict.fromkeys(ENTITIES, 'off')
+
+
+def test_batches_per_domain_without_homeassistant_service(fake: FakeHass) -> None:
+    client = HassClient(fake.api_url, fake.token)
+    poller = StatePoller(client)
+    domains = DomainRegistry(client)
+    service = {'name': 'Turn on', 'description': '', 'fields': {}}
+    domains.restore([
+        {'domain': 'homeassistant', 'services': {}},
+        {'domain': 'light', 'services': {'turn_on': service}},
+        {'domain': 'switch', 'services': {'turn_on': service}},
+    ])
+    fake.states['light.desk']['state'] = fake.states['switch.fan']['state'] = 'off'
+
+    assert plan_batches(domains, 'turn_on', ['light.desk', 'switch.fan', 'light.bed']) == {'light': ['light.desk', 'light.bed'], 'switch': ['switch.fan']}
+    call_service_bulk(domains, poller, 'turn_on', ['light.desk', 'switch.fan', 'light.bed'])
+
+    assert sorted(fake.requests) == [('POST', '/api/services/light/turn_on'), ('POST', '/api/services/switch/turn_on')]
+    assert poller.states['light.desk'].state == poller.states['switch.fan'].state == 'on'
+
+
+def test_services_are_loaded_on_first_use(fake: FakeHass) -> None:
+    client = HassClient(fake.api_url, fake.token)
+    domains = DomainRegistry(client)
+    assert not domains.loaded
+
+    assert domains.has_service('homeassistant', 'turn_off')
+    assert domains.has_service('light', 'toggle')
+    assert not domains.has_service('light', 'open')
+    assert fake.requests.count(('GET', '/api/services')) == 1
+
+
+def test_failed_batch_keeps_the_others(fake: FakeHass, monkeypatch: pytest.MonkeyPatch) -> None:
+    client = HassClient(fake.api_url, fake.token)
+    poller = StatePoller(client)
+    domains = DomainRegistry(client)
+    service = {'name': 'Turn on', 'description': '', 'fields': {}}
+    domains.restore([
+        {'domain': 'homeassistant', 'services': {}},
+        {'domain': 'light', 'services': {'turn_on': service}},
+        {'domain': 'switch', 'services': {'turn_on': service}},
+    ])
+    fake.states['switch.fan']['state'] = 'off'
+    poller.poll()
+    call = domains.call
+
+    def call_or_time_out(domain_id: str, service: str, **service_data: Any) -> Any:
+        if domain_id == 'light':
+            raise ha.errors.RequestTimeoutError('timed out')
+        return call(domain_id, service, **service_data)
+
+    monkeypatch.setattr(domains, 'call', call_or_time_out)
+
+    with pytest.raises(ha.errors.RequestTimeoutError):
+        call_service_bulk(domains, poller, 'turn_on', ['light.desk', 'switch.fan'])
+
+    # the switch batch succeeded and the light was confirmed with a fetch
+    assert poller.states['switch.fan'].state == 'on'
+    assert ('GET', '/api/states/light.desk') in fake.requests
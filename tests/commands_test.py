@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from hometray.commands import CommandExecutor
+
+
+def test_latest_value_wins() -> None:
+    commands = CommandExecutor(min_interval=0.05)
+    sent: list[int] = []
+    done = threading.Event()
+
+    def send(value: int) -> None:
+        time.sleep(0.01)
+        sent.append(value)
+        if value == 99:
+            done.set()
+
+    for value in range(100):
+        commands.submit_latest(('light.desk', 'turn_on', 'rgb_color'), lambda value=value: send(value))  # type: ignore[misc]
+        time.sleep(0.002)
+
+    assert done.wait(2)
+    commands.shutdown()
+    assert sent[0] == 0 and sent[-1] == 99
+    assert sent == sorted(sent)
+    assert len(sent) < 20
+
+
+def test_keys_are_independent() -> None:
+    commands = CommandExecutor(min_interval=10)
+    sent: list[str] = []
+    commands.submit_latest('a', lambda: sent.append('a'))
+    commands.submit_latest('b', lambda: sent.append('b'))
+    commands.submit(lambda: None).result()
+
+    assert sent == ['a', 'b']
+    commands.shutdown()
@@ -1,3 +1,6 @@
+import os
+import sys
+import threading
 import pytest
 from typing import Generator
 from hometray.config import Config
@@ -44,3 +47,95 @@ def test_write(config: Config) -> None:
 
     config.entities = ["entity3", "entity4"]
     assert config.entities == ["entity3", "entity4"]
+
+
+def test_instances_are_independent(config: Config, tmp_path: Path) -> None:
+    other_path = tmp_path / "other.ini"
+    other_path.write_text("[TEST]\nToken = other-token\n")
+    other = Config(str(other_path), "TEST", "COLORS")
+
+    assert other.token == "other-token"
+    assert config.token == "test-token"
+
+
+def test_values_are_cached(config: Config, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert config.color_on == [1, 2, 3]
+
+    def fail(*args: object, **kwargs: object) -> None:
+        raise AssertionError("config parser accessed")
+
+    monkeypatch.setattr(config._config, "get", fail)
+    assert config.color_on == [1, 2, 3]
+
+
+def test_batch_writes_once(config: Config, monkeypatch: pytest.MonkeyPatch) -> None:
+    writes = []
+    monkeypatch.setattr(config._config, "write", lambda f: writes.append(f))
+
+    with config.batch():
+        config.api_url = "http://test3.com"
+        config.token = "token3"
+        config.entities = ["entity5"]
+        assert writes == []
+
+    assert len(writes) == 1
+
+
+def test_save_is_atomic(config: Config, tmp_path: Path) -> None:
+    config.token = "new-token"
+
+    assert [p.name for p in tmp_path.iterdir()] == ["test.ini"]
+    assert Config(config.filename, "TEST", "COLORS").token == "new-token"
+
+
+def test_reload_if_changed(config: Config) -> None:
+    changes = []
+    config.add_listener(lambda: changes.append(config.update_interval))
+    assert not config.reload_if_changed()
+
+    config.update_interval = 7
+    assert changes == [7]
+    assert not config.reload_if_changed()
+
+    text = Path(config.filename).read_text().replace("updateinterval = 7", "updateinterval = 9")
+    Path(config.filename).write_text(text)
+    os.utime(config.filename, ns=(0, 0))
+
+    assert config.reload_if_changed()
+    assert config.update_interval == 9
+    assert changes == [7, 9]
+
+
+def test_reload_on_another_thread(config: Config) -> None:
+    stop = threading.Event()
+
+    def reload() -> None:
+        mtime = 0
+        while not stop.is_set():
+            mtime += 1
+            os.utime(config.filename, ns=(mtime, mtime))
+            config.reload_if_changed()
+
+    # switch threads as often as possible, so reads land in the middle of a reload
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=reload)
+    thread.start()
+    try:
+        for _ in range(5000):
+            # never the default of a value that is being read again
+            assert config.token == "test-token"
+            assert config.update_interval == 5
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(switch_interval)
+
+
+def test_groups(tmp_path: Path) -> None:
+    config_path = tmp_path / "groups.ini"
+    config_path.write_text("[HASS]\nGroupDomains = yes\n\n[GROUPS]\nliving_room = area:Living Room,light.desk\n")
+    config = Config.load(str(config_path))
+
+    assert config.group_domains
+    assert config.groups == {"Living Room": ["area:Living Room", "light.desk"]}
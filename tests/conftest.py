@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the app is started as `python hometray`, so its modules import each other by their top-level names
+sys.path.insert(0, str(Path(__file__).parent.parent / 'hometray'))
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from hometray.entitystate import EntityState
+
+
+def test_keeps_only_shown_fields() -> None:
+    data = {
+        'entity_id': 'light.desk',
+        'state': 'on',
+        'attributes': {'friendly_name': 'Desk', 'icon': 'mdi:desk-lamp', 'rgb_color': [255, 0, 0], 'brightness': 200, 'supported_color_modes': ['rgb']},
+        'last_changed': '2023-01-01T00:00:00+00:00',
+        'context': {'id': 'abc'},
+    }
+    state = EntityState.from_json(data)
+
+    assert (state.entity_id, state.state, state.icon, state.name, state.rgb_color) == ('light.desk', 'on', 'mdi:desk-lamp', 'Desk', (255, 0, 0))
+    assert state.to_json() == {'entity_id': 'light.desk', 'state': 'on', 'attributes': {'icon': 'mdi:desk-lamp', 'friendly_name': 'Desk', 'rgb_color': [255, 0, 0]}}
+    assert EntityState.from_json(state.to_json()) == state
+
+
+def test_values_are_shared() -> None:
+    first = EntityState.from_json({'entity_id': 'light.desk', 'state': ''.join(['o', 'n']), 'attributes': {'icon': 'mdi:lamp'}})
+    second = EntityState.from_json({'entity_id': 'light.bed', 'state': ''.join(['o', 'n']), 'attributes': {'icon': ''.join(['mdi:', 'lamp'])}})
+
+    assert first.state is second.state
+    assert first.icon is second.icon
+
+
+def test_replace() -> None:
+    state = EntityState('light.desk', 'on', rgb_color=(1, 2, 3))
+    toggled = state.replace(state='off')
+
+    assert toggled.state == 'off' and toggled.rgb_color == (1, 2, 3)
+    assert state.state == 'on'
+    assert toggled != state
+    assert state.name == 'light.desk'
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from hometray.groups import GroupResolver
+from hometray.groups import GroupSummary
+
+
+class TemplateClient:
+    def __init__(self) -> None:
+        self.templates: list[str] = []
+
+    def get_rendered_template(self, template: str) -> str:
+        self.templates.append(template)
+        return 'light.kitchen,switch.kettle' if "'Kitchen'" in template or '"Kitchen"' in template else ''
+
+
+def test_summary_counts_incrementally() -> None:
+    summary = GroupSummary()
+    assert summary.state == 'unavailable'
+
+    assert summary.update('light.desk', 'on')
+    assert summary.update('light.bed', 'off')
+    assert not summary.update('light.desk', 'on')
+    assert (summary.state, summary.describe()) == ('on', '1 of 2 on')
+
+    assert summary.update('light.desk', 'off')
+    assert (summary.state, summary.describe()) == ('off', '0 of 2 on')
+
+    summary.remove('light.bed')
+    summary.remove('light.desk')
+    assert (summary.state, summary.total) == ('unavailable', 0)
+
+
+def test_resolve_members() -> None:
+    client = TemplateClient()
+    resolver = GroupResolver(client)  # type: ignore[arg-type]
+    groups = {'Kitchen': ['area:Kitchen', 'light.desk'], 'Lights': ['domain:light', 'light.desk']}
+    resolver.load_areas(groups)
+
+    known = ['light.desk', 'light.kitchen', 'switch.kettle', 'lightbulb.other']
+    assert resolver.resolve(groups['Kitchen'], known) == ['light.kitchen', 'switch.kettle', 'light.desk']
+    assert resolver.resolve(groups['Lights'], known) == ['light.desk', 'light.kitchen']
+    assert len(client.templates) == 1
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import io
+import json
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from hometray.config import Config
+from hometray.headless import HeadlessApp
+from hometray.headless import parse_command
+from testing.fakehass import FakeHass
+
+
+@pytest.fixture(name='fake')
+def fake_fixture() -> Iterator[FakeHass]:
+    fake = FakeHass().start()
+    fake.add_entity('light.desk', 'off', friendly_name='Desk', icon='mdi:desk-lamp')
+    fake.add_entity('light.bed', 'on', friendly_name='Bed')
+    fake.add_entity('switch.fan', 'on')
+    yield fake
+    fake.stop()
+
+
+def test_parse_command() -> None:
+    assert parse_command('toggle light.desk light.bed\n') == ('toggle', ['light.desk', 'light.bed'])
+    assert parse_command('{"service": "turn_on", "entity_id": "light.desk"}') == ('turn_on', ['light.desk'])
+    assert parse_command('quit') is None
+    with pytest.raises(ValueError):
+        parse_command('open light.desk')
+    with pytest.raises(ValueError):
+        parse_command('toggle')
+
+
+def test_streams_states_and_runs_commands(fake: FakeHass, tmp_path: Path) -> None:
+    config_path = tmp_path / 'config.ini'
+    config_path.write_text(f'[HASS]\nToken = {fake.token}\nApiUrl = {fake.api_url}\nDomains = light\nEntities = switch.fan\n\n[COLORS]\nOn = 1,2,3\n', encoding='utf8')
+    out = io.StringIO()
+    app = HeadlessApp(Config.load(str(config_path)), out)
+
+    assert app.run(io.StringIO('toggle light.desk\nopen light.desk\nquit\n')) == 0
+
+    events = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert events[0] == {'type': 'state', 'entity_id': 'light.desk', 'state': 'off', 'icon': 'mdi:desk-lamp', 'color': [225, 225, 225], 'tooltip': 'Desk'}
+    assert {event['entity_id'] for event in events if event['type'] == 'state'} == {'light.desk', 'light.bed', 'switch.fan'}
+    assert {'type': 'ready', 'entities': 3, 'groups': 0} in events
+    assert [event['error'] for event in events if event['type'] == 'error'] == ["Unknown service 'open', expected one of toggle, turn_on, turn_off or quit"]
+    assert events[-1]['entity_id'] == 'light.desk' and events[-1]['state'] == 'on' and events[-1]['color'] == [1, 2, 3]
+    assert fake.states['light.desk']['state'] == 'on'
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import socket
+import time
+
+import pytest
+import requests
+
+from hometray.hassclient import HassClient
+from hometray.health import CircuitOpenError
+from hometray.health import ConnectionHealth
+from testing.fakehass import FakeHass
+
+
+def unused_url() -> str:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    return f'http://127.0.0.1:{port}/api'
+
+
+def test_opens_after_consecutive_failures_and_backs_off() -> None:
+    health = ConnectionHealth(failure_threshold=2, base_delay=1, max_delay=3)
+    changes: list[bool] = []
+    health.add_listener(changes.append)
+
+    health.record_failure()
+    health.record_success()
+    health.record_failure()
+    assert health.available
+
+    health.record_failure()
+    assert not health.available
+    with pytest.raises(CircuitOpenError):
+        health.check()
+
+    delays = []
+    for _ in range(3):
+        with health.probe():
+            health.check()
+            health.record_failure()
+        delays.append(health.delay)
+    assert delays == [2, 3, 3]
+
+    health.record_success()
+    assert health.available and health.delay == 1
+    assert changes == [False, True]
+
+
+def test_only_one_probe_at_a_time() -> None:
+    health = ConnectionHealth()
+    with health.probe():
+        with pytest.raises(CircuitOpenError):
+            with health.probe():
+                pass
+
+
+def test_client_fails_fast_while_unreachable() -> None:
+    client = HassClient(unused_url(), 'test-token', health=ConnectionHealth(failure_threshold=2))
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.get_state(entity_id='light.desk')
+
+    start = time.perf_counter()
+    with pytest.raises(CircuitOpenError):
+        client.get_state(entity_id='light.desk')
+    assert time.perf_counter() - start < 0.1
+    assert not client.probe()
+
+    fake = FakeHass().start()
+    try:
+        fake.add_entity('light.desk', 'on')
+        client.api_url = f'{fake.api_url}/'
+        assert client.probe()
+        assert client.get_state(entity_id='light.desk').state == 'on'
+    finally:
+        fake.stop()
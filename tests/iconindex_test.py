@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from hometray.iconindex import IconIndex
+
+
+@pytest.fixture(name='pack')
+def pack_fixture(tmp_path: Path) -> Path:
+    pack = tmp_path / 'icons'
+    pack.mkdir()
+    for name in ['default-on', 'default-off', 'unknown', 'mdi-lamp-on', 'mdi-lamp-off']:
+        (pack / f'{name}.svg').write_text(name)
+    with zipfile.ZipFile(pack / 'mdi.zip', 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('svg/mdi-fan-on.svg', 'zipped fan on')
+        archive.writestr('svg/mdi-lamp-on.svg', 'zipped lamp on')
+    return pack
+
+
+def test_resolve(pack: Path) -> None:
+    index = IconIndex([pack])
+    assert index.resolve('mdi:lamp', 'on').read() == b'mdi-lamp-on'
+    assert index.resolve('mdi:lamp', 'unavailable').read() == b'mdi-lamp-on'
+    assert index.resolve('mdi:bulb', 'off').read() == b'default-off'
+    assert index.resolve('mdi:bulb', 'unavailable').read() == b'unknown'
+
+
+def test_resolve_from_archive(pack: Path) -> None:
+    index = IconIndex([pack])
+    assert index.resolve('mdi:fan', 'ON').read() == b'zipped fan on'
+
+
+def test_resolve_stateless_icons(tmp_path: Path) -> None:
+    pack = tmp_path / 'mdi'
+    pack.mkdir()
+    for name in ['unknown', 'mdi-ceiling-light', 'mdi-lightbulb', 'mdi-lightbulb-off']:
+        (pack / f'{name}.svg').write_text(name)
+    with zipfile.ZipFile(pack / 'mdi.zip', 'w') as archive:
+        archive.writestr('svg/mdi-led-strip-variant.svg', 'zipped led strip')
+
+    index = IconIndex([pack])
+    assert index.resolve('mdi:ceiling-light', 'on').read() == b'mdi-ceiling-light'
+    assert index.resolve('mdi:ceiling-light', 'unavailable').read() == b'mdi-ceiling-light'
+    assert index.resolve('mdi:led-strip-variant', 'off').read() == b'zipped led strip'
+    # a state suffix is a state variant of the icon and a stateless icon of its own
+    assert index.resolve('mdi:lightbulb', 'off').read() == b'mdi-lightbulb-off'
+    assert index.resolve('mdi:lightbulb', 'on').read() == b'mdi-lightbulb'
+    assert index.resolve('mdi:lightbulb-off', 'on').read() == b'mdi-lightbulb-off'
+    assert index.resolve('mdi:fan', 'on').read() == b'unknown'
+
+
+def test_earlier_packs_take_precedence(pack: Path, tmp_path: Path) -> None:
+    custom = tmp_path / 'custom'
+    custom.mkdir()
+    (custom / 'mdi-lamp-on.svg').write_text('custom lamp')
+
+    index = IconIndex([custom, pack])
+    assert index.resolve('mdi:lamp', 'on').read() == b'custom lamp'
+
+
+def test_resolve_does_not_touch_filesystem(pack: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    index = IconIndex([pack])
+
+    def fail(*args: object) -> None:
+        raise AssertionError('filesystem access')
+
+    monkeypatch.setattr(Path, 'is_file', fail)
+    monkeypatch.setattr(Path, 'exists', fail)
+    assert index.resolve('mdi:lamp', 'off').source.name == 'mdi-lamp-off.svg'
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from hometray.metrics import Metrics
+
+
+def test_disabled_records_nothing() -> None:
+    metrics = Metrics()
+    metrics.inc('polls')
+    with metrics.timer('request'):
+        pass
+
+    assert metrics.counters == {}
+    assert metrics.histograms == {}
+    assert 'disabled' in metrics.summary()
+
+
+def test_prometheus_text(tmp_path: Path) -> None:
+    metrics = Metrics(enabled=True)
+    metrics.inc('hometray_polls_total', kind='bulk')
+    metrics.inc('hometray_polls_total', kind='bulk')
+    metrics.observe('hometray_request_seconds', 0.02, endpoint='states')
+    metrics.observe('hometray_request_seconds', 3, endpoint='states')
+
+    text = metrics.to_prometheus()
+    assert 'hometray_polls_total{kind="bulk"} 2' in text
+    assert 'hometray_request_seconds_bucket{endpoint="states",le="0.025"} 1' in text
+    assert 'hometray_request_seconds_bucket{endpoint="states",le="+Inf"} 2' in text
+    assert 'hometray_request_seconds_count{endpoint="states"} 2' in text
+
+    metrics.write(tmp_path / 'hometray.prom')
+    assert (tmp_path / 'hometray.prom').read_text() == text
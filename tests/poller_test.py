@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from typing import Any
+
+import homeassistant_api as ha
+import pytest
+
+from hometray import poller as poller_module
+from hometray.poller import PollPolicy
+from hometray.poller import StatePoller
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.states: dict[str, dict[str, Any]] = {
+            'light.desk': {'entity_id': 'light.desk', 'state': 'on', 'attributes': {}},
+            'light.bed': {'entity_id': 'light.bed', 'state': 'off', 'attributes': {}},
+        }
+        self.requests = 0
+
+    def request(self, path: str) -> Any:
+        self.requests += 1
+        if path == 'states':
+            return list(self.states.values())
+        entity_id = path[len('states/'):]
+        if entity_id not in self.states:
+            raise ha.errors.EndpointNotFoundError(f'Cannot find entity {entity_id}')
+        return self.states[entity_id]
+
+
+class FakeTime:
+    now = 0.0
+
+    @classmethod
+    def monotonic(cls) -> float:
+        return cls.now
+
+
+@pytest.fixture(name='clock')
+def clock_fixture(monkeypatch: pytest.MonkeyPatch) -> type[FakeTime]:
+    FakeTime.now = 0.0
+    monkeypatch.setattr(poller_module, 'time', FakeTime)
+    return FakeTime
+
+
+@pytest.fixture(name='client')
+def client_fixture() -> FakeClient:
+    return FakeClient()
+
+
+def test_poll_uses_one_request(client: FakeClient) -> None:
+    poller = StatePoller(client)  # type: ignore[arg-type]
+    seen: list[str] = []
+    poller.subscribe('light.desk', lambda state: seen.append(state.state))
+    poller.subscribe('light.bed', lambda state: seen.append(state.state))
+
+    poller.poll()
+
+    assert client.requests == 1
+    assert sorted(seen) == ['off', 'on']
+    assert poller.entity_ids('light') == ['light.desk', 'light.bed']
+
+
+def test_poll_only_notifies_changes(client: FakeClient) -> None:
+    poller = StatePoller(client)  # type: ignore[arg-type]
+    poller.poll()
+    seen: list[str] = []
+    poller.subscribe('light.desk', lambda state: seen.append(state.state))
+    assert seen == ['on']
+
+    poller.poll()
+    assert seen == ['on']
+
+    client.states['light.desk']['state'] = 'off'
+    poller.poll()
+    assert seen == ['on', 'off']
+
+
+def test_policy_backs_off() -> None:
+    policy = PollPolicy(min_interval=5, max_interval=60, backoff=2)
+    assert policy.next_interval(None, False) == 5
+    assert policy.next_interval(5, False) == 10
+    assert policy.next_interval(40, False) == 60
+    assert policy.next_interval(60, True) == 5
+
+
+def test_idle_entities_are_polled_less(client: FakeClient, clock: type[FakeTime]) -> None:
+    poller = StatePoller(client, PollPolicy(min_interval=5, max_interval=60, backoff=2))  # type: ignore[arg-type]
+    poller.subscribe('light.desk', lambda state: None)
+    poller.subscribe('light.bed', lambda state: None)
+
+    for second in range(600):
+        clock.now = second
+        poller.tick()
+
+    # a fixed 5s interval would need 120 requests
+    assert client.requests <= 15
+
+
+def test_boost_polls_single_entity_quickly(client: FakeClient, clock: type[FakeTime]) -> None:
+    poller = StatePoller(client, PollPolicy(min_interval=5, fast_interval=1, fast_window=3))  # type: ignore[arg-type]
+    poller.subscribe('light.desk', lambda state: None)
+    poller.subscribe('light.bed', lambda state: None)
+    poller.poll()
+    client.requests = 0
+
+    poller.boost('light.desk')
+    for second in range(1, 5):
+        clock.now = second
+        poller.tick()
+
+    # one single-entity request per second while the window lasts, the other entity stays idle
+    assert client.requests == 3
+
+
+def test_unknown_entity_backs_off(client: FakeClient, clock: type[FakeTime]) -> None:
+    poller = StatePoller(client, PollPolicy(min_interval=5, max_interval=60, backoff=2, fast_interval=1))  # type: ignore[arg-type]
+    seen: list[str] = []
+    poller.subscribe('light.removed', lambda state: None)
+    poller.subscribe('light.desk', lambda state: seen.append(state.state))
+    poller.poll()
+    client.requests = 0
+
+    for second in range(300):
+        clock.now = second
+        if second == 150:
+            client.states['light.desk']['state'] = 'off'
+        poller.tick()
+
+    # the unknown entity is polled less and less often instead of on every tick
+    assert client.requests <= 20
+    assert seen[-1] == 'off'
+
+
+def test_failing_entity_does_not_skip_the_others(client: FakeClient, clock: type[FakeTime]) -> None:
+    poller = StatePoller(client, PollPolicy(min_interval=5))  # type: ignore[arg-type]
+    poller.bulk_threshold = 3
+    poller.subscribe('light.removed', lambda state: None)
+    seen: list[str] = []
+    poller.subscribe('light.desk', lambda state: seen.append(state.state))
+
+    clock.now = 5
+    poller.tick()
+
+    assert seen == ['on']
+
+
+def test_restore_marks_states_stale(client: FakeClient) -> None:
+    poller = StatePoller(client)  # type: ignore[arg-type]
+    poller.poll()
+    snapshot = poller.to_json()
+
+    restored = StatePoller(client)  # type: ignore[arg-type]
+    restored.restore(snapshot)
+    seen: list[str] = []
+    restored.subscribe('light.desk', lambda state: seen.append(state.state))
+    assert restored.stale
+    assert seen == ['on']
+
+    # the first poll notifies even unchanged entities, so the stale marker is removed
+    restored.poll()
+    assert not restored.stale
+    assert seen == ['on', 'on']
+
+
+def test_attributes_that_are_not_shown_are_ignored(client: FakeClient) -> None:
+    poller = StatePoller(client)  # type: ignore[arg-type]
+    poller.poll()
+    seen: list[str] = []
+    poller.subscribe('light.desk', lambda state: seen.append(state.state))
+    indexed = poller.states['light.desk']
+
+    client.states['light.desk']['attributes'] = {'brightness': 120}
+    poller.poll()
+    assert seen == ['on']
+    assert poller.states['light.desk'] is indexed
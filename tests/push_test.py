@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import threading
+from typing import Generator
+
+import homeassistant_api as ha
+import pytest
+
+from hometray.entitystate import EntityState
+from hometray.health import ConnectionHealth
+from hometray.poller import StatePoller
+from hometray.push import StateStream
+from hometray.push import websocket_url
+from testing.fakehass import FakeHass
+
+
+@pytest.fixture(name='hass')
+def hass_fixture() -> Generator[FakeHass, None, None]:
+    hass = FakeHass().start()
+    hass.add_entity('light.desk', 'on')
+    yield hass
+    hass.stop()
+
+
+@pytest.fixture(name='poller')
+def poller_fixture(hass: FakeHass) -> StatePoller:
+    poller = StatePoller(ha.Client(hass.api_url, hass.token, cache_session=False))
+    poller.poll()
+    return poller
+
+
+def wait_for_subscription(hass: FakeHass, stream: StateStream) -> None:
+    assert stream.connected.wait(5)
+    for _ in range(50):
+        if hass.subscriber_count:
+            return
+        threading.Event().wait(0.02)
+
+
+def test_websocket_url() -> None:
+    assert websocket_url('http://192.168.0.125:8123/api') == 'ws://192.168.0.125:8123/api/websocket'
+    assert websocket_url('https://hass.local/api/') == 'wss://hass.local/api/websocket'
+
+
+def test_state_changed_events_are_applied(hass: FakeHass, poller: StatePoller) -> None:
+    changed = threading.Event()
+    seen: list[str] = []
+
+    def on_state(state: EntityState) -> None:
+        seen.append(state.state)
+        changed.set()
+
+    poller.subscribe('light.desk', on_state)
+    seen.clear()
+    changed.clear()
+
+    stream = StateStream(hass.api_url, hass.token, poller, reconnect_delay=0.1)
+    stream.start()
+    try:
+        wait_for_subscription(hass, stream)
+        hass.set_state('light.desk', 'off')
+        assert changed.wait(5)
+        assert seen == ['off']
+    finally:
+        stream.stop()
+
+
+def test_disconnect_triggers_single_resync(hass: FakeHass, poller: StatePoller) -> None:
+    stream = StateStream(hass.api_url, hass.token, poller, reconnect_delay=0.1)
+    stream.start()
+    try:
+        wait_for_subscription(hass, stream)
+        polls = hass.requests.count(('GET', '/api/states'))
+
+        hass.drop_connections()
+        stream.connected.clear()
+        wait_for_subscription(hass, stream)
+
+        assert hass.requests.count(('GET', '/api/states')) == polls + 1
+    finally:
+        stream.stop()
+
+
+def test_change_while_disconnected_is_resynced(hass: FakeHass, poller: StatePoller) -> None:
+    stream = StateStream(hass.api_url, hass.token, poller, reconnect_delay=0.3)
+    stream.start()
+    try:
+        wait_for_subscription(hass, stream)
+        hass.drop_connections()
+        for _ in range(50):
+            if not stream.connected.is_set():
+                break
+            threading.Event().wait(0.02)
+
+        # changed while the stream waits before reconnecting, no event is sent for it
+        hass.set_state('light.desk', 'off')
+        wait_for_subscription(hass, stream)
+
+        assert poller.states['light.desk'].state == 'off'
+    finally:
+        stream.stop()
+
+
+def test_unanswered_ping_reconnects(hass: FakeHass, poller: StatePoller) -> None:
+    stream = StateStream(hass.api_url, hass.token, poller, reconnect_delay=0.1, ping_interval=0.1)
+    stream.start()
+    try:
+        wait_for_subscription(hass, stream)
+        polls = hass.requests.count(('GET', '/api/states'))
+
+        hass.answer_pings = False
+        for _ in range(100):
+            if hass.requests.count(('GET', '/api/states')) > polls:
+                break
+            threading.Event().wait(0.02)
+
+        assert hass.requests.count(('GET', '/api/states')) > polls
+    finally:
+        stream.stop()
+
+
+def test_close_frame_reconnects(hass: FakeHass, poller: StatePoller) -> None:
+    stream = StateStream(hass.api_url, hass.token, poller, reconnect_delay=0.1)
+    stream.start()
+    try:
+        wait_for_subscription(hass, stream)
+        polls = hass.requests.count(('GET', '/api/states'))
+
+        hass.close_connections()
+        for _ in range(100):
+            if hass.requests.count(('GET', '/api/states')) > polls:
+                break
+            threading.Event().wait(0.02)
+
+        wait_for_subscription(hass, stream)
+        hass.set_state('light.desk', 'off')
+        for _ in range(100):
+            if poller.states['light.desk'].state == 'off':
+                break
+            threading.Event().wait(0.02)
+        assert poller.states['light.desk'].state == 'off'
+    finally:
+        stream.stop()
+
+
+def test_failed_resync_keeps_the_stream_running(hass: FakeHass, poller: StatePoller, monkeypatch: pytest.MonkeyPatch) -> None:
+    polls = []
+
+    def poll() -> None:
+        polls.append(True)
+        if len(polls) == 1:
+            # like the errors of homeassistant_api, which don't derive from Exception
+            raise ha.errors.RequestTimeoutError('timed out')
+
+    monkeypatch.setattr(poller, 'poll', poll)
+    stream = StateStream(hass.api_url, hass.token, poller, reconnect_delay=0.1)
+    stream.start()
+    try:
+        wait_for_subscription(hass, stream)
+        hass.drop_connections()
+        for _ in range(100):
+            if len(polls) > 1:
+                break
+            threading.Event().wait(0.02)
+        assert len(polls) > 1
+    finally:
+        stream.stop()
+
+
+def test_outage_marks_the_entities_offline(hass: FakeHass, poller: StatePoller) -> None:
+    health = ConnectionHealth(failure_threshold=2)
+    # like Engine.on_health_changed
+    health.add_listener(lambda available: setattr(poller, 'offline', not available))
+    stream = StateStream(hass.api_url, hass.token, poller, reconnect_delay=0.05, health=health)
+    stream.start()
+    try:
+        wait_for_subscription(hass, stream)
+        assert not poller.offline
+
+        hass.stop()
+        for _ in range(100):
+            if poller.offline:
+                break
+            threading.Event().wait(0.02)
+        assert poller.offline
+    finally:
+        stream.stop()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import importlib
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from benchmarks import headlesswx
+
+PIXELS = bytes(range(64))
+
+
+@pytest.fixture(name='iconmanager')
+def iconmanager_fixture() -> Any:
+    # loading a cached icon creates a wx.Bitmap, the headless stand-in decodes the PNG instead
+    headlesswx.install()
+    return importlib.import_module('iconmanager')
+
+
+def fill(cache: Any, *keys: str) -> None:
+    for key in keys:
+        cache.put(key, PIXELS, 4)
+    cache.close()
+
+
+def test_stored_icon_is_read_back(iconmanager: Any, tmp_path: Path) -> None:
+    cache = iconmanager.RasterCache(tmp_path)
+    fill(cache, 'lamp')
+
+    assert cache.contains('lamp')
+    bitmap = cache.get('lamp')
+    assert bitmap.IsOk()
+    assert (bitmap.GetWidth(), bitmap.GetHeight(), bitmap.buffer) == (4, 4, PIXELS)
+    assert [path.name for path in tmp_path.iterdir()] == ['lamp.png']
+
+
+def test_evicts_least_recently_used_beyond_max_bytes(iconmanager: Any, tmp_path: Path) -> None:
+    fill(iconmanager.RasterCache(tmp_path), 'probe')
+    size = (tmp_path / 'probe.png').stat().st_size
+    (tmp_path / 'probe.png').unlink()
+
+    cache = iconmanager.RasterCache(tmp_path, max_bytes=3 * size)
+    fill(cache, 'a', 'b', 'c', 'd', 'e')
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['c.png', 'd.png', 'e.png']
+
+
+def test_eviction_order_survives_a_restart(iconmanager: Any, tmp_path: Path) -> None:
+    fill(iconmanager.RasterCache(tmp_path), 'a', 'b', 'c')
+    size = (tmp_path / 'a.png').stat().st_size
+    for age, key in enumerate(['c', 'b', 'a']):
+        os.utime(tmp_path / f'{key}.png', ns=(0, (10 - age) * 10**9))
+
+    cache = iconmanager.RasterCache(tmp_path, max_bytes=3 * size)
+    # a is the oldest file, reading it makes b the least recently used one
+    assert cache.get('a') is not None
+    fill(cache, 'd')
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['a.png', 'c.png', 'd.png']
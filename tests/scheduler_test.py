@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from hometray.scheduler import Scheduler
+
+
+def test_jobs_run_on_one_thread() -> None:
+    scheduler = Scheduler()
+    threads: set[int] = set()
+    done = threading.Event()
+
+    def job() -> None:
+        threads.add(threading.get_ident())
+        if time.monotonic() - start > 0.2:
+            done.set()
+
+    start = time.monotonic()
+    for _ in range(20):
+        scheduler.every(0.01, job)
+    scheduler.start()
+    try:
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+
+    assert len(threads) == 1
+    assert threading.active_count() < 20
+
+
+def test_slow_job_does_not_pile_up() -> None:
+    scheduler = Scheduler(jitter=0)
+    runs: list[float] = []
+
+    def slow() -> None:
+        runs.append(time.monotonic())
+        time.sleep(0.1)
+
+    scheduler.every(0.01, slow)
+    scheduler.start()
+    time.sleep(0.35)
+    scheduler.stop()
+
+    # one run per 0.1s + interval, never a burst of missed runs
+    assert 2 <= len(runs) <= 4
+    assert all(b - a >= 0.1 for a, b in zip(runs, runs[1:]))
+
+
+def test_call_soon_is_bounded() -> None:
+    scheduler = Scheduler(max_pending=2)
+    calls: list[int] = []
+    done = threading.Event()
+
+    assert scheduler.call_soon(lambda: calls.append(1))
+    assert scheduler.call_soon(done.set)
+    assert not scheduler.call_soon(lambda: calls.append(3))
+    assert not scheduler.call_soon(done.set)
+
+    scheduler.start()
+    assert done.wait(5)
+    scheduler.stop()
+    assert calls == [1]
+
+
+def test_cancel() -> None:
+    scheduler = Scheduler()
+    calls: list[int] = []
+    job = scheduler.every(0.01, lambda: calls.append(1))
+    job.cancel()
+    scheduler.start()
+    time.sleep(0.05)
+    scheduler.stop()
+    assert calls == []
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import importlib
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+from hometray.startup import StartupProfile
+
+
+def test_times_imports_and_phases(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    (tmp_path / 'profiled_outer.py').write_text('import profiled_inner\n', encoding='utf8')
+    (tmp_path / 'profiled_inner.py').write_text('import time\ntime.sleep(0.02)\n', encoding='utf8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    output = tmp_path / 'profile.json'
+
+    profile = StartupProfile()
+    profile.enable(str(output))
+    try:
+        importlib.import_module('profiled_outer')
+        profile.mark('imports')
+        profile.finish('first icon')
+    finally:
+        sys.modules.pop('profiled_outer', None)
+        sys.modules.pop('profiled_inner', None)
+
+    outer_cumulative, outer_self = profile.imports['profiled_outer']
+    inner_cumulative, _ = profile.imports['profiled_inner']
+    assert inner_cumulative >= 0.02
+    assert outer_cumulative >= inner_cumulative > outer_self
+    assert [phase for phase, _ in profile.phases] == ['imports', 'first icon']
+    assert all(not isinstance(finder, type(profile._finder)) for finder in sys.meta_path)
+
+    assert 'profiled_inner' in capsys.readouterr().err
+    assert set(json.loads(output.read_text(encoding='utf8'))['phases']) == {'imports', 'first icon'}
+
+    # the report is only written once, later calls are ignored
+    profile.finish('first icon')
+    assert len(profile.phases) == 2
+
+
+def test_disabled_profile_records_nothing() -> None:
+    profile = StartupProfile()
+    profile.mark('imports')
+    profile.finish('first icon')
+    assert not profile.phases
@@ -0,0 +1,11 @@
+from hometray.svgtemplate import SvgTemplate
+
+
+def test_render_replaces_all_fills() -> None:
+    template = SvgTemplate(b'<svg><path fill="#fff" d="M0"/><path fill="#123456" d="M1"/></svg>')
+    assert template.render([1, 2, 255]) == b'<svg><path fill="#0102ff" d="M0"/><path fill="#0102ff" d="M1"/></svg>'
+
+
+def test_content_hash_depends_on_content() -> None:
+    assert SvgTemplate(b'<svg/>').content_hash == SvgTemplate(b'<svg/>').content_hash
+    assert SvgTemplate(b'<svg/>').content_hash != SvgTemplate(b'<svg />').content_hash
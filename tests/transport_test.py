@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterator
+
+import pytest
+
+from hometray.hassclient import HassClient
+from testing.fakehass import FakeHass
+
+
+@pytest.fixture(name='fake')
+def fake_fixture() -> Iterator[FakeHass]:
+    fake = FakeHass().start()
+    fake.add_entity('light.desk', 'on')
+    yield fake
+    fake.stop()
+
+
+def test_keep_alive_and_gzip(fake: FakeHass) -> None:
+    client = HassClient(fake.api_url, fake.token, dedup_window=0)
+    for _ in range(10):
+        client.get_state(entity_id='light.desk')
+
+    assert fake.connections == 1
+    response = client.cache_session.get(f'{fake.api_url}/states', headers={'Authorization': f'Bearer {fake.token}'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.json()[0]['entity_id'] == 'light.desk'
+
+
+def test_concurrent_requests_share_one_response(fake: FakeHass) -> None:
+    fake.latency = 0.1
+    client = HassClient(fake.api_url, fake.token)
+    barrier = threading.Barrier(6)
+    states = []
+
+    def refresh() -> None:
+        barrier.wait()
+        states.append(client.get_state(entity_id='light.desk').state)
+
+    threads = [threading.Thread(target=refresh) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert states == ['on'] * 6
+    assert fake.requests == [('GET', '/api/states/light.desk')]
+
+
+def test_commands_end_the_reuse(fake: FakeHass) -> None:
+    client = HassClient(fake.api_url, fake.token, dedup_window=60)
+    assert client.get_state(entity_id='light.desk').state == 'on'
+    assert client.get_state(entity_id='light.desk').state == 'on'
+    assert len(fake.requests) == 1
+
+    client.trigger_service('light', 'turn_off', entity_id='light.desk')
+    assert client.get_state(entity_id='light.desk').state == 'off'
+
+
+def test_conditional_requests(fake: FakeHass) -> None:
+    fake.etags = True
+    client = HassClient(fake.api_url, fake.token, dedup_window=0)
+    assert client.get_state(entity_id='light.desk').state == 'on'
+    assert client.get_state(entity_id='light.desk').state == 'on'
+
+    fake.add_entity('light.desk', 'off')
+    assert client.get_state(entity_id='light.desk').state == 'off'
+    assert len(fake.requests) == 3
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import contextlib
+import importlib
+import io
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from benchmarks import headlesswx
+from testing.fakehass import FakeHass
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture(name='app')
+def app_fixture(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Any]:
+    # the tray runs on the headless stand-in of wxPython, which records the icons instead of drawing them
+    headlesswx.install()
+    app_module = importlib.import_module('app')
+
+    fake = FakeHass().start()
+    fake.add_entity('light.desk', 'on', rgb_color=[250, 130, 10])
+    (tmp_path / 'icons').symlink_to(ROOT / 'icons', target_is_directory=True)
+    (tmp_path / 'config.ini').write_text(f'[HASS]\nToken = {fake.token}\nApiUrl = {fake.api_url}\nEntities = light.desk\n\n[COLORS]\n', encoding='utf8')
+    monkeypatch.chdir(tmp_path)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = app_module.App(False)
+    headlesswx.pump()
+    try:
+        yield app
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            app.OnExit()
+        headlesswx.discard()
+        fake.stop()
+
+
+def test_reconcile_redraws_when_only_the_quantization_changed(app: Any) -> None:
+    tray_icon = app.tray_icons[0]
+    updates = tray_icon.icon_updates
+
+    # saving the config reconciles the app on the UI thread
+    app.config.color_quantization = 16
+    headlesswx.pump()
+
+    assert tray_icon.icon_updates == updates + 1
+    # drawn with the quantized colour
+    assert app.icons.icon_handles.get(('default', 'on', (255, 128, 16))) is tray_icon.icon
+
+
+def test_identical_updates_set_the_icon_once(app: Any) -> None:
+    tray_icon = app.tray_icons[0]
+    updates = tray_icon.icon_updates
+
+    for _ in range(3):
+        tray_icon.set_icon('default', 'off', [0, 0, 0], 'Desk')
+        headlesswx.pump()
+
+    assert tray_icon.icon_updates == updates + 1
+    assert tray_icon.tooltip == 'Desk'
+
+
+def test_burst_of_updates_is_coalesced(app: Any) -> None:
+    tray_icon = app.tray_icons[0]
+    updates = tray_icon.icon_updates
+
+    # updates from the poller arrive faster than the UI thread applies them
+    for brightness in range(0, 250, 50):
+        tray_icon.set_icon('default', 'on', [brightness, brightness, brightness], f'Desk {brightness}')
+
+    assert headlesswx.pump() == 1
+    assert tray_icon.icon_updates == updates + 1
+    assert tray_icon.tooltip == 'Desk 200'